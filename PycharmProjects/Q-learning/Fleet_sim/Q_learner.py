@@ -1,52 +1,83 @@
 import numpy as np
+from Fleet_sim import geo
+from Fleet_sim.q_table import QTable
+from Fleet_sim.replay_buffer import ReplayBuffer
+
+
+def reward(charging, distance, missed_trips):
+    # Works on scalars and arrays alike, see Fleet_sim.charging_env
+    return charging / 100 + distance / 10 + missed_trips
 
 
 class RL_agent:
-    def __init__(self, env):
+    # States are (SOC, time, position, supply, waiting_list)
+    state_shape = (10, 24, 89, 50, 50)
+
+    def __init__(self, env, lazy=True, q_table=None, buffer_size=65536, replay=0):
         self.env = env
-        self.q_table = dict()
-        for i in range(10):
-            for ii in range(24):
-                for iii in range(89):
-                    for iiii in range(50):
-                        for iiiii in range(50):
-                            state = dict(SOC=i, time=ii, position=iii, supply=iiii, waiting_list=iiiii)
-                            self.q_table[state['SOC'], state['time'], state['position'],
-                                         state['supply'], state['waiting_list']] = [round(np.random.uniform(-1, 0), 2)
-                                                                                    for i in range(2)]
+        if q_table is None:
+            q_table = QTable(self.state_shape, n_actions=2, lazy=lazy)
+        self.q_table = q_table
+        self.alpha = 0.1
+        self.gamma = 0.5
+        # Transitions are collected here and applied to the Q-table in batches by learn
+        self.buffer = ReplayBuffer(buffer_size)
+        # Past transitions replayed with every batch
+        self.replay = replay
+        # State (flat index) and action of each vehicle's last decision, by fleet row; -1 if none
+        self.pending_state = np.full(0, -1, dtype=np.int64)
+        self.pending_action = np.zeros(0, dtype=np.int8)
+
+    def get_states(self, fleet, rows, vehicles, waiting_list):
+        # States of the vehicles in the given fleet rows, one row each, encoded in one pass
+        rows = np.asarray(rows, dtype=np.intp)
+        SOC = np.clip(fleet.charge_state[rows] // 10, 0, 9).astype(np.int64)
+        hour = min(int(self.env.now % 1440 // 60), 23)
+        position = fleet.zone[rows].astype(np.int64)
+        lat = fleet.lat[rows]
+        long = fleet.long[rows]
+        # Vehicles with at least 30% SOC and waiting trips within 2 km
+        others = fleet.rows_of(vehicles)
+        others = others[fleet.charge_state[others] >= 30]
+        supply = geo.count_within(lat, long, fleet.lat[others], fleet.long[others], 2)
+        lats, longs = geo.coordinates([t.origin for t in waiting_list])
+        wl = geo.count_within(lat, long, lats, longs, 2)
+        return np.column_stack((SOC, np.full(len(rows), hour), position, supply, wl))
 
     def get_state(self, vehicle, vehicles, waiting_list):
-        for i in range(10):
-            if i * 10 <= vehicle.charge_state <= (i + 1) * 10:
-                SOC = i
-        for j in range(0, 24):
-            if j * 60 <= self.env.now % 1440 <= (j + 1) * 60:
-                hour = j
-        position = vehicle.position.id
-        supply = len([v for v in vehicles if v.location.distance_1(vehicle.location) <= 2 and v.charge_state >= 30])
-        wl = len([t for t in waiting_list if t.origin.distance_1(vehicle.location) <= 2])
-        return (SOC, hour, position, supply, wl)
-
-    def take_action(self, vehicle, vehicles, waiting_list):
+        return tuple(self.get_states(vehicle.fleet, [vehicle.row], vehicles, waiting_list)[0].tolist())
+
+    def take_action(self, vehicle, vehicles, waiting_list, state=None):
         epsilon = 0.1
-        state = self.get_state(vehicle, vehicles, waiting_list)
+        if state is None:
+            state = self.get_state(vehicle, vehicles, waiting_list)
         if np.random.random() > epsilon:
             action = np.argmax(self.q_table[state])
         else:
             action = np.random.randint(0, 1)
-        vehicle.old_state = state
-        vehicle.old_q = self.q_table[state][action]
-        vehicle.old_action = action
-        vehicle.old_time = self.env.now
+        if vehicle.row >= len(self.pending_state):
+            n = max(2 * len(self.pending_state), vehicle.row + 1)
+            self.pending_state = np.concatenate((self.pending_state, np.full(n - len(self.pending_state), -1)))
+            self.pending_action = np.concatenate((self.pending_action,
+                                                  np.zeros(n - len(self.pending_action), dtype=np.int8)))
+        self.pending_state[vehicle.row] = self.q_table.index(state)
+        self.pending_action[vehicle.row] = action
         vehicle.reward['missed_trips'] = 0
         return action
 
     def update_value(self, vehicle, vehicles, waiting_list):
-        alpha = 0.1
-        GAMMA = 0.5
+        # The transition since the vehicle's last decision is stored; learn applies it
+        if vehicle.row >= len(self.pending_state) or self.pending_state[vehicle.row] < 0:
+            return
         state = self.get_state(vehicle, vehicles, waiting_list)
-        q = max(self.q_table[state])
-        vehicle.r = vehicle.reward['charging'] / 100 + vehicle.reward['distance'] / 10 + vehicle.reward[
-            'missed_trips']
-        self.q_table[vehicle.old_state][vehicle.old_action] = vehicle.old_q + \
-                                                              alpha * (vehicle.r + GAMMA * q - vehicle.old_q)
+        vehicle.r = reward(vehicle.reward['charging'], vehicle.reward['distance'], vehicle.reward['missed_trips'])
+        if self.buffer.append(self.pending_state[vehicle.row], self.pending_action[vehicle.row], vehicle.r,
+                              self.q_table.index(state)):
+            self.learn()
+
+    def learn(self, rng=None):
+        # One vectorised update with the transitions collected since the last call, plus replayed ones
+        if self.buffer.fresh:
+            self.q_table.update(*self.buffer.take_fresh(), alpha=self.alpha, gamma=self.gamma)
+        if self.replay and len(self.buffer):
+            self.q_table.update(*self.buffer.sample(self.replay, rng), alpha=self.alpha, gamma=self.gamma)
@@ -4,16 +4,16 @@ from Fleet_sim.location import Location
 
 
 class Zone:
-    def __init__(self, id, hexagon, demand, destination):
+    def __init__(self, id, hexagon, index, demand, destination_order, destination_cdf):
         self.id = id
+        # Row of this zone in the demand and OD arrays of Fleet_sim.read
+        self.index = index
         self.polygon = shape(
             {"type": "Polygon", "coordinates": [h3.h3_to_geo_boundary(hexagon, geo_json=True)], "properties": ""})
         self.centre = Location(self.polygon.centroid.y, self.polygon.centroid.x)
         self.hexagon = hexagon
-        self.list_of_vehicles = []
-        self.demand = demand
-        self.destination = destination
-
-    def update(self, vehicles):
-        self.list_of_vehicles = [vehicle for vehicle in vehicles
-                                 if vehicle.position == self.id and vehicle.mode in ['idle', 'parking']]
+        # Trips per hour of the day
+        self.demand = demand[index]
+        # Destination zone indices sorted by cumulative probability, and those probabilities
+        self.destination_order = destination_order[index]
+        self.destination_cdf = destination_cdf[index]
@@ -0,0 +1,193 @@
+import numpy as np
+from Fleet_sim import geo
+from Fleet_sim.Q_learner import RL_agent, reward
+from Fleet_sim.read import zones, charging_station_zones, sample_destinations
+from Fleet_sim.vehicle import Vehicle
+
+
+class ChargingEnv:
+    """The charging decision of RL_agent without simpy, for many vehicles and many environment copies at once.
+
+    ``n_envs`` independent copies of a fleet of ``n_vehicles`` are stepped together,
+    ``step_minutes`` at a time. Vehicles are located at zone centres. Every step, each
+    vehicle that is free (not charging or on a trip) takes an action, as in
+    Model.charge_task: 0 sends it to the nearest charging station, where it charges to
+    the time-of-day threshold of Vehicle.charging, anything else keeps it in service.
+    Trips then arrive per zone at the rates of the demand table and are served by free
+    vehicles of their zone with at least 20% SOC; their destinations follow the OD
+    table. Unserved trips count against every vehicle within 15 km, like
+    Model.missed_trip, and the reward of a step is Fleet_sim.Q_learner.reward.
+
+    States have the layout of RL_agent.get_state. Since vehicles stand at zone
+    centres, which are more than 2 km apart, supply and waiting trips within 2 km are
+    those of the vehicle's zone. Plugs are not limited.
+
+    Distances are road distances between zone centres from ``travel_matrix`` (a
+    TravelMatrix over the zone centres), or geodesic distances at Vehicle.speed.
+    """
+
+    capacity = 50  # kWh, as the vehicles of main.py
+    fuel_consumption = 0.20  # kWh/km, as Vehicle
+    power = 11 / 60  # kWh/min, as the charging stations of main.py
+    SOC_threshold = 20
+
+    def __init__(self, n_envs=64, n_vehicles=300, step_minutes=60, horizon=1440, seed=None, travel_matrix=None):
+        self.rng = np.random.default_rng(seed)
+        self.n_envs = n_envs
+        self.n_vehicles = n_vehicles
+        self.step_minutes = step_minutes
+        self.horizon = horizon
+        self.zone_ids = np.array([z.id for z in zones])
+        self.zone_rows = np.array([z.index for z in zones])
+        self.demand = np.stack([z.demand for z in zones])
+        lats, longs = geo.coordinates([z.centre for z in zones])
+        if travel_matrix is None:
+            self.distance = geo.distance_matrix(lats, longs, lats, longs)
+            self.duration = self.distance / Vehicle.speed
+        else:
+            self.distance = np.asarray(travel_matrix.distance)
+            self.duration = np.asarray(travel_matrix.duration)
+        stations = np.flatnonzero(np.isin(self.zone_ids, charging_station_zones))
+        nearest = stations[np.argmin(self.distance[:, stations], axis=1)]
+        self.station_of = nearest
+        self.distance_to_station = self.distance[np.arange(len(zones)), nearest]
+        self.duration_to_station = self.duration[np.arange(len(zones)), nearest]
+        # near[i, j]: a trip missed in zone i counts against the vehicles in zone j
+        self.near = (geo.distance_matrix(lats, longs, lats, longs) <= 15).astype(float)
+        self.reset()
+
+    def reset(self):
+        shape = (self.n_envs, self.n_vehicles)
+        self.t = 0.0
+        self.soc = self.rng.integers(70, 76, shape).astype(float)
+        self.zone = self.rng.integers(0, len(self.zone_ids), shape)
+        self.busy_until = np.zeros(shape)
+        self.charging = np.zeros(shape, dtype=bool)
+        self.charge_target = np.zeros(shape)
+        self.waiting = np.zeros((self.n_envs, len(self.zone_ids)), dtype=np.int64)
+        return self.observe()
+
+    @property
+    def deciding(self):
+        # Vehicles that take an action in the next step
+        return self.busy_until <= self.t
+
+    def observe(self):
+        n_zones = len(self.zone_ids)
+        groups = np.arange(self.n_envs)[:, None] * n_zones + self.zone
+        supply = np.bincount(groups[self.soc >= 30], minlength=self.n_envs * n_zones).reshape(self.n_envs, n_zones)
+        hour = min(int(self.t % 1440 // 60), 23)
+        env = np.arange(self.n_envs)[:, None]
+        return np.stack(np.broadcast_arrays(np.clip(self.soc // 10, 0, 9).astype(np.int64), hour,
+                                            self.zone_ids[self.zone], supply[env, self.zone],
+                                            self.waiting[env, self.zone]), axis=-1)
+
+    def consumption(self, distance):
+        return distance * self.fuel_consumption * 100.0 / self.capacity
+
+    def step(self, actions):
+        # actions: n_envs x n_vehicles, only read for deciding vehicles. Returns the states after the step,
+        # the rewards of the step and whether the episode is over
+        n_zones = len(self.zone_ids)
+        env = np.arange(self.n_envs)[:, None]
+        charge = self.deciding & (np.asarray(actions) == 0)
+        # Drive to the closest station and charge to the threshold of the time of day
+        distance = np.where(charge, self.distance_to_station[self.zone], 0.0)
+        soc = self.soc - self.consumption(distance)
+        minute = self.t % 1440
+        threshold = 100 if minute < 0.25 * 1440 or minute >= 0.75 * 1440 else 80
+        charged = np.maximum(threshold - soc, 0)
+        charging_cost = np.where(charge, charged / 100 * 50 * Vehicle.charging_cost, 0.0)
+        charge_duration = self.duration_to_station[self.zone] + charged * self.capacity / (100 * self.power)
+        self.busy_until = np.where(charge, self.t + charge_duration, self.busy_until)
+        self.soc = np.where(charge, soc, self.soc)
+        self.charging |= charge
+        self.charge_target = np.where(charge, soc + charged, self.charge_target)
+        self.zone = np.where(charge, self.station_of[self.zone], self.zone)
+
+        # Trips of the step, served by free vehicles of their zone in random order
+        hour = min(int(minute // 60), 23)
+        arrivals = self.rng.poisson(self.demand[:, hour] * self.step_minutes / 60, (self.n_envs, n_zones))
+        free = (self.busy_until <= self.t) & (self.soc >= self.SOC_threshold)
+        groups = (env * n_zones + self.zone)[free]
+        order = np.lexsort((self.rng.random(len(groups)), groups))
+        sorted_groups = groups[order]
+        first = np.searchsorted(sorted_groups, sorted_groups, side='left')
+        rank = np.empty(len(groups), dtype=np.int64)
+        rank[order] = np.arange(len(groups)) - first
+        served_free = rank < arrivals.ravel()[groups]
+        served = np.zeros_like(free)
+        served[free] = served_free
+        e, v = np.nonzero(served)
+        origin = self.zone[e, v]
+        destination = sample_destinations(self.zone_rows[origin], self.rng.uniform(0, 1, len(origin)))
+        self.soc[e, v] -= self.consumption(self.distance[origin, destination])
+        self.busy_until[e, v] = self.t + self.duration[origin, destination]
+        self.zone[e, v] = destination
+        n_served = np.bincount(e * n_zones + origin, minlength=self.n_envs * n_zones).reshape(self.n_envs, n_zones)
+        self.waiting = arrivals - n_served
+        missed = (self.waiting @ self.near)[env, self.zone]
+
+        self.t += self.step_minutes
+        # The SOC of charging vehicles is raised when they are done, as in Vehicle.finish_charging
+        finished = self.charging & (self.busy_until <= self.t)
+        self.soc[finished] = self.charge_target[finished]
+        self.charging &= ~finished
+        rewards = reward(charging_cost, distance, missed)
+        return self.observe(), rewards, self.t >= self.horizon
+
+
+def train(q_table, env, episodes=100, epsilon=0.1, alpha=0.1, gamma=0.5, rng=None, visits=None):
+    # Q-learning on the environment in batches: a vehicle's transition runs from one of its decisions to the
+    # next, with the rewards of the steps in between, as between take_action and update_value. With a list
+    # as visits, the (entries, counts) of every update are appended to it
+    rng = np.random.default_rng() if rng is None else rng
+    shape = (env.n_envs, env.n_vehicles)
+    for episode in range(episodes):
+        states = env.reset()
+        pending_state = np.zeros(shape + (states.shape[-1],), dtype=np.int64)
+        pending_action = np.full(shape, -1)
+        pending_reward = np.zeros(shape)
+        done = False
+        while not done:
+            deciding = env.deciding
+            complete = deciding & (pending_action >= 0)
+            if complete.any():
+                updated = update(q_table, pending_state[complete], pending_action[complete],
+                                 pending_reward[complete], states[complete], alpha, gamma)
+                if visits is not None:
+                    visits.append(updated)
+            rows = q_table.rows_many(states[deciding])
+            greedy = np.argmax(q_table.values[rows], axis=1)
+            explore = rng.random(len(rows)) < epsilon
+            actions = np.zeros(shape, dtype=np.int64)
+            actions[deciding] = np.where(explore, rng.integers(0, q_table.n_actions, len(rows)), greedy)
+            pending_state[deciding] = states[deciding]
+            pending_action[deciding] = actions[deciding]
+            pending_reward[deciding] = 0
+            states, rewards, done = env.step(actions)
+            pending_reward += rewards
+    return q_table
+
+
+def update(q_table, states, actions, rewards, next_states, alpha=0.1, gamma=0.5):
+    return q_table.update(q_table.index_many(states), actions, rewards, q_table.index_many(next_states), alpha,
+                          gamma)
+
+
+if __name__ == '__main__':
+    # Train the table Model.charge_task uses: python -m Fleet_sim.charging_env
+    import os
+    import time
+    from Fleet_sim.q_table import QTable
+    q_table_path = 'q_table.npy'
+    if os.path.exists(q_table_path):
+        q_table = QTable.load(q_table_path, RL_agent.state_shape, mmap_mode=None)
+    else:
+        q_table = QTable(RL_agent.state_shape)
+    env = ChargingEnv(seed=0)
+    start = time.time()
+    train(q_table, env, episodes=10)
+    transitions = 10 * env.n_envs * env.n_vehicles * env.horizon // env.step_minutes
+    print(f'{transitions} vehicle steps in {time.time() - start:.1f}s, {len(q_table)} states')
+    q_table.save(q_table_path)
@@ -0,0 +1,79 @@
+import numpy as np
+from Fleet_sim.results import modes_array
+
+
+class FleetObserver:
+    """Snapshots of every vehicle and charging station, one row per observation.
+
+    Each snapshot copies the fleet columns into preallocated typed arrays
+    (SOC, location, zone id and mode code per vehicle, occupied plugs per
+    station), so one process observes the whole system instead of one per
+    vehicle. With a ``sink`` (a ResultsWriter) full buffers are written to it
+    in long format and reused; without one they keep ``capacity`` snapshots and
+    double when it is exceeded.
+    """
+
+    columns = dict(soc=np.float32, lat=np.float32, long=np.float32, zone=np.int16, mode=np.int8)
+
+    def __init__(self, fleet, charging_stations, capacity=1024, sink=None):
+        self.fleet = fleet
+        self.charging_stations = charging_stations
+        self.sink = sink
+        self.size = 0
+        self.times = np.zeros(capacity)
+        n = len(fleet)
+        self.data = {name: np.zeros((capacity, n), dtype=dtype) for name, dtype in self.columns.items()}
+        self.plugs = np.zeros((capacity, len(charging_stations)), dtype=np.int16)
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, name):
+        # Observed columns so far, snapshots x vehicles: observer.soc, observer.mode, ...
+        data = self.__dict__.get('data')
+        if data is None or name not in data:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+        return data[name][:self.size]
+
+    def _grow(self):
+        self.times = np.concatenate((self.times, np.zeros_like(self.times)))
+        for name, column in self.data.items():
+            self.data[name] = np.concatenate((column, np.zeros_like(column)))
+        self.plugs = np.concatenate((self.plugs, np.zeros_like(self.plugs)))
+
+    def snapshot(self, t):
+        if self.size == len(self.times):
+            if self.sink is not None:
+                self.flush()
+            else:
+                self._grow()
+        i = self.size
+        fleet = self.fleet
+        n = min(len(fleet), self.data['soc'].shape[1])
+        self.times[i] = t
+        self.data['soc'][i, :n] = fleet.charge_state[:n]
+        self.data['lat'][i, :n] = fleet.lat[:n]
+        self.data['long'][i, :n] = fleet.long[:n]
+        self.data['zone'][i, :n] = fleet.zone[:n]
+        self.data['mode'][i, :n] = fleet.mode[:n]
+        for j, charging_station in enumerate(self.charging_stations):
+            self.plugs[i, j] = charging_station.plugs.count
+        self.size += 1
+
+    def flush(self):
+        # Write the buffered snapshots to the sink, one row per vehicle (station) and snapshot; the
+        # columns are copied because the buffers are reused
+        if self.sink is None or self.size == 0:
+            return
+        n_snapshots = self.size
+        n = self.data['soc'].shape[1]
+        vehicle_ids = np.array([vehicle.id for vehicle in self.fleet.vehicles[:n]], dtype=np.int32)
+        self.sink.write('vehicles', dict(time=np.repeat(self.times[:n_snapshots], n),
+                                         vehicle_id=np.tile(vehicle_ids, n_snapshots),
+                                         SOC=self.soc.flatten(), lat=self.lat.flatten(), long=self.long.flatten(),
+                                         zone=self.zone.flatten(), mode=modes_array(self.mode.flatten())))
+        station_ids = np.array([cs.id for cs in self.charging_stations], dtype=np.int32)
+        self.sink.write('stations', dict(time=np.repeat(self.times[:n_snapshots], len(station_ids)),
+                                         station_id=np.tile(station_ids, n_snapshots),
+                                         plugs=self.plugs[:n_snapshots].flatten()))
+        self.size = 0
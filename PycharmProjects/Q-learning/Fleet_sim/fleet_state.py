@@ -0,0 +1,126 @@
+import numpy as np
+
+# Vehicle modes and the codes they are stored as
+MODES = ('idle', 'locked', 'active', 'relocating', 'charging', 'ertc', 'ertp', 'parking', 'circling')
+MODE_CODES = {mode: code for code, mode in enumerate(MODES)}
+
+
+def mode_codes(modes):
+    return np.array([MODE_CODES[m] for m in modes], dtype=np.int8)
+
+
+class FleetState:
+    """Location, SOC, mode and zone of every vehicle, one row per vehicle.
+
+    Vehicles read and write their row through properties, so fleet-wide queries
+    can work on the columns directly, e.g. ``fleet.mask('idle', 'parking')``.
+    Columns are sliced to the number of vehicles added. ``zone_supply[zone id]`` is
+    the number of idle or parked vehicles in each zone, kept up to date on every
+    mode or zone change.
+    """
+
+    columns = dict(lat=float, long=float, charge_state=float, battery_capacity=float, fuel_consumption=float,
+                   mode=np.int8, zone=np.int16)
+
+    def __init__(self, capacity=300):
+        self.size = 0
+        self.vehicles = []
+        self.data = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.columns.items()}
+        self.zones_by_id = dict()
+        self.dirty_sets = []
+        self.supply_codes = mode_codes(('idle', 'parking'))
+        self.zone_supply = np.zeros(128, dtype=np.int32)
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, name):
+        # Columns of the vehicles added so far: fleet.lat, fleet.mode, ...
+        data = self.__dict__.get('data')
+        if data is None or name not in data:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+        return data[name][:self.size]
+
+    def add(self, vehicle):
+        if self.size == len(self.data['lat']):
+            for name, column in self.data.items():
+                grown = np.zeros(2 * len(column), dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                self.data[name] = grown
+        row = self.size
+        self.size += 1
+        self.vehicles.append(vehicle)
+        self._count(row, 1)
+        for dirty in self.dirty_sets:
+            dirty.add(row)
+        return row
+
+    def track(self):
+        # A set that collects the rows whose location or mode changes, e.g. for a VehicleIndex
+        dirty = set()
+        self.dirty_sets.append(dirty)
+        return dirty
+
+    def get(self, name, row):
+        return self.data[name][row].item()
+
+    def set(self, name, row, value):
+        if name in ('mode', 'zone'):
+            self._count(row, -1)
+            self.data[name][row] = value
+            self._count(row, 1)
+        else:
+            self.data[name][row] = value
+        if name in ('lat', 'long', 'mode'):
+            for dirty in self.dirty_sets:
+                dirty.add(row)
+
+    def _count(self, row, change):
+        if self.data['mode'][row] in self.supply_codes:
+            zone = self.data['zone'][row]
+            if zone >= len(self.zone_supply):
+                grown = np.zeros(2 * zone + 1, dtype=self.zone_supply.dtype)
+                grown[:len(self.zone_supply)] = self.zone_supply
+                self.zone_supply = grown
+            self.zone_supply[zone] += change
+
+    def supply_of(self, zone_ids):
+        # Idle and parked vehicles in each of the given zones
+        zone_ids = np.asarray(zone_ids)
+        supply = np.zeros(len(zone_ids), dtype=self.zone_supply.dtype)
+        known = zone_ids < len(self.zone_supply)
+        supply[known] = self.zone_supply[zone_ids[known]]
+        return supply
+
+    def set_zone(self, row, zone):
+        self.zones_by_id[zone.id] = zone
+        self.set('zone', row, zone.id)
+
+    def zone_of(self, row):
+        return self.zones_by_id[self.data['zone'][row].item()]
+
+    def rows_of(self, vehicles):
+        # Rows of the given vehicles, which must all belong to this store
+        if vehicles is self.vehicles or vehicles == self.vehicles:
+            return np.arange(self.size)
+        return np.array([vehicle.row for vehicle in vehicles], dtype=np.intp)
+
+    def coordinates(self):
+        return self.lat, self.long
+
+    def mask(self, *modes):
+        return np.isin(self.mode, mode_codes(modes))
+
+    def select(self, mask):
+        return [self.vehicles[i] for i in np.flatnonzero(mask).tolist()]
+
+    @classmethod
+    def of(cls, vehicles):
+        # The store shared by these vehicles; vehicles from different stores are moved into a new one
+        fleet = vehicles[0].fleet if vehicles else None
+        if fleet is not None and fleet.vehicles == vehicles:
+            return fleet
+        fleet = cls(max(len(vehicles), 1))
+        for vehicle in vehicles:
+            vehicle.bind(fleet)
+        return fleet
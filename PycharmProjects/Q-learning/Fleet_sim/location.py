@@ -1,15 +1,20 @@
 from geopy.distance import geodesic
-import random
-import openpyxl
-from shapely.geometry import Point, shape
+import numpy as np
 from h3 import h3
-import requests
-import osmnx as ox
-import networkx as nx
 # ox.config(use_cache=True, log_console=True)
-from Fleet_sim.read1 import G
+from Fleet_sim import geo
+from Fleet_sim.read1 import road_graph, route_cache
 
-network = nx.Graph(G)
+# Precomputed road distances (see Fleet_sim.travel_matrix), set through use_travel_matrix
+travel_matrix = None
+snap_to_matrix = False
+
+
+def use_travel_matrix(matrix, snap=True):
+    # With snap=True any point inside a zone of the matrix is answered from that zone's centre
+    global travel_matrix, snap_to_matrix
+    travel_matrix = matrix
+    snap_to_matrix = snap
 
 '''def find_zone(loc, zones):
     hexagon = h3.geo_to_h3(loc.long, loc.lat, 7)
@@ -23,11 +28,43 @@ network = nx.Graph(G)
     return position'''
 
 
-def find_zone(loc, zones):
+'''def find_zone(loc, zones):
     distances_to_centers = [loc.distance_1(zone.centre) for zone in zones]
     position = [x for x in zones
                 if x.centre.distance_1(loc) == min(distances_to_centers)][0]
-    return position
+    return position'''
+
+
+class ZoneIndex:
+    # Zones are H3 hexagons, so the zone of a point is found by hashing its cell
+
+    def __init__(self, zones):
+        self.source = zones
+        self.zones = list(zones)
+        self.by_hexagon = {z.hexagon: z for z in self.zones}
+        self.resolution = h3.h3_get_resolution(self.zones[0].hexagon)
+        self.lat, self.long = geo.coordinates([z.centre for z in self.zones])
+
+    def find(self, loc):
+        zone = self.by_hexagon.get(h3.geo_to_h3(loc.lat, loc.long, self.resolution))
+        if zone is None:
+            zone = self.nearest(loc)
+        return zone
+
+    def nearest(self, loc):
+        # Points outside the covered hexagons belong to the zone with the closest centre
+        distances = geo.distances(loc.lat, loc.long, self.lat, self.long, 'haversine')
+        return self.zones[int(np.argmin(distances))]
+
+
+zone_index = None
+
+
+def find_zone(loc, zones):
+    global zone_index
+    if zone_index is None or zone_index.source is not zones or len(zone_index.zones) != len(zones):
+        zone_index = ZoneIndex(zones)
+    return zone_index.find(loc)
 
 
 class Location:
@@ -47,21 +84,24 @@ class Location:
         return geodesic(origin, destination).kilometers'''
 
     def distance(self, loc):
-        try:
-            orig = ox.get_nearest_node(G, (self.lat, self.long))
-            dest = ox.get_nearest_node(G, (loc.lat, loc.long))
-            route = ox.shortest_path(G, orig, dest, weight='travel_time')
-            edge_lengths = ox.utils_graph.get_route_edge_attributes(G, route, 'length')
-            edge_time = ox.utils_graph.get_route_edge_attributes(G, route, 'travel_time')
-            dis = sum(edge_lengths) / 1000
-            dur = sum(edge_time) / 60
-            return [dis, dur]
-        except:
-            origin = [self.lat, self.long]
-            destination = [loc.lat, loc.long]
-            dis = geodesic(origin, destination).kilometers
-            dur = dis/0.5
-            return [dis, dur]
+        if travel_matrix is not None:
+            distance_duration = travel_matrix.lookup(self, loc, snap_to_matrix)
+            if distance_duration is not None:
+                return distance_duration
+        orig, dest = road_graph.nearest_nodes([self.lat, loc.lat], [self.long, loc.long]).tolist()
+        key = (int(road_graph.node_ids[orig]), int(road_graph.node_ids[dest]))
+        distance_duration = route_cache.get(*key)
+        if distance_duration is None:
+            distance_duration = road_graph.route(orig, dest)
+            if distance_duration is None:
+                # No route between the snapped nodes
+                origin = [self.lat, self.long]
+                destination = [loc.lat, loc.long]
+                dis = geodesic(origin, destination).kilometers
+                dur = dis/0.5
+                return [dis, dur]
+            route_cache.put(*key, distance_duration)
+        return distance_duration
 
     '''def distance(self, loc):
         wp_1_long = self.long
@@ -75,18 +115,43 @@ class Location:
 
 
 def generate_random(hex):
-    polygon = shape(
-        {"type": "Polygon", "coordinates": [h3.h3_to_geo_boundary(hex, geo_json=True)], "properties": ""})
-    minx, miny, maxx, maxy = polygon.bounds
-    c = True
-    while c:
-        pnt = Point(random.uniform(minx, maxx), random.uniform(miny, maxy))  # x=long, y=lat
-        if polygon.contains(pnt):
-            c = False
-
-        return Location(pnt.y, pnt.x)
+    lats, longs = random_points(hex, 1)
+    return Location(lats[0], longs[0])
 
     """import googlemaps
     API_key = 'AIzaSyCxGGUs - xbyFZFsiDDSKNP7QIjGr - Is1DA'
     gmaps = googlemaps.Client(key=API_key)
     result = gmaps.distance_matrix(origins, destination, mode='walking')["rows"][0]["elements"][0]["distance"]["value"]"""
+
+
+# Triangle fan of each hexagon sampled so far: hex -> (centre, vertices, next vertices, cumulative area share)
+_fans = dict()
+
+
+def _fan(hex):
+    fan = _fans.get(hex)
+    if fan is None:
+        vertices = np.array(h3.h3_to_geo_boundary(hex))  # (lat, long) rows
+        centre = vertices.mean(axis=0)
+        following = np.roll(vertices, -1, axis=0)
+        a = vertices - centre
+        b = following - centre
+        areas = np.abs(a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0])
+        fan = _fans[hex] = (centre, vertices, following, np.cumsum(areas) / areas.sum())
+    return fan
+
+
+def random_points(hex, n, rng=None):
+    # n uniform points inside the hexagon as (lat, long) arrays: a fan triangle is picked by area and a
+    # point drawn inside it, so every draw is used
+    rng = np.random if rng is None else rng
+    centre, vertices, following, cdf = _fan(hex)
+    triangle = np.minimum(np.searchsorted(cdf, rng.uniform(0, 1, n), side='right'), len(cdf) - 1)
+    u = rng.uniform(0, 1, n)
+    v = rng.uniform(0, 1, n)
+    # Points beyond the triangle's third edge are folded back into it
+    outside = u + v > 1
+    u[outside] = 1 - u[outside]
+    v[outside] = 1 - v[outside]
+    points = centre + u[:, None] * (vertices[triangle] - centre) + v[:, None] * (following[triangle] - centre)
+    return points[:, 0], points[:, 1]
@@ -1,43 +1,80 @@
-import pandas as pd
+import numpy as np
 import simpy
+from scipy.optimize import linear_sum_assignment
+from Fleet_sim import geo
+from Fleet_sim.fleet_state import FleetState
+from Fleet_sim.fleet_observer import FleetObserver
+from Fleet_sim.results import ResultsWriter, trip_record, export_excel
+from Fleet_sim.vehicle_index import VehicleIndex
 from Fleet_sim.location import find_zone
 from Fleet_sim.trip import Trip
 from Fleet_sim.Q_learner import RL_agent
+from Fleet_sim.tracer import tracer
 
 
 # This function give us the available vehicles for a trip
-def available_vehicle(vehicles, trip, SOC_threshold=20, max_distance=10):
-    available_vehicles = list()
-    for vehicle in vehicles:
-        distance_to_pickup = vehicle.location.distance_1(trip.origin)
-        distance_to_dropoff = trip.distance
-        charge_consumption = (distance_to_pickup + distance_to_dropoff) * \
-                             vehicle.fuel_consumption * 100.0 / vehicle.battery_capacity
-        # Add idle vehicles that have enough energy to respond the trip into available vehicles and are not far away
-        # too much
-        if distance_to_pickup <= max_distance:
-            if charge_consumption + SOC_threshold <= vehicle.charge_state and vehicle.mode in ['idle', 'parking',
-                                                                                               'circling']:
-                available_vehicles.append(vehicle)
-    return available_vehicles
+def available_vehicle(vehicles, trip, SOC_threshold=20, max_distance=10, index=None):
+    # Vehicles are returned closest first; with an index (over the fleet of vehicles) only the indexed vehicles
+    # near the trip are checked
+    if len(vehicles) == 0:
+        return []
+    fleet = vehicles[0].fleet
+    if index is not None:
+        if index.fleet is not fleet or len(fleet) != len(vehicles):
+            raise ValueError('available_vehicle: the index is not over these vehicles')
+        rows, distance_to_pickup = index.query(trip.origin.lat, trip.origin.long, max_distance)
+    else:
+        rows = fleet.rows_of(vehicles)
+        distance_to_pickup = geo.distances(trip.origin.lat, trip.origin.long, fleet.lat[rows], fleet.long[rows])
+        order = np.argsort(distance_to_pickup, kind='stable')
+        rows = rows[order]
+        distance_to_pickup = distance_to_pickup[order]
+    distance_to_dropoff = trip.distance
+    charge_consumption = (distance_to_pickup + distance_to_dropoff) * \
+                         fleet.fuel_consumption[rows] * 100.0 / fleet.battery_capacity[rows]
+    # Add idle vehicles that have enough energy to respond the trip into available vehicles and are not far away
+    # too much
+    available = (distance_to_pickup <= max_distance) & \
+                (charge_consumption + SOC_threshold <= fleet.charge_state[rows]) & \
+                fleet.mask('idle', 'parking', 'circling')[rows]
+    return [fleet.vehicles[i] for i in rows[available].tolist()]
 
 
 class Model:
 
-    def __init__(self, env, vehicles, charging_stations, zones, parkings, simulation_time=500):
-        self.t = []
+    def __init__(self, env, vehicles, charging_stations, zones, parkings, simulation_time=500, q_table=None,
+                 dispatch='greedy', batch_window=1, results=None):
         self.parkings = parkings
         self.zones = zones
         self.charging_stations = charging_stations
         self.vehicles = vehicles
+        self.fleet = FleetState.of(vehicles)
+        # Vehicles that can be dispatched to a trip
+        self.dispatchable = VehicleIndex(self.fleet, ('idle', 'parking', 'circling'))
+        # All vehicles, for attributing missed trips
+        self.nearby = VehicleIndex(self.fleet, cell_size=5.0)
+        # Unassigned trips are missed after waiting this many minutes
+        self.max_waiting = 15
+        self.zone_ids = np.array([z.id for z in zones])
+        self.zone_demand = np.stack([z.demand for z in zones])
+        # Unassigned trips per origin zone id
+        self.zone_waiting = np.zeros(max(z.id for z in zones) + 1, dtype=np.int32)
+        # 'greedy' assigns each trip to the closest vehicle as it arrives, 'batch' collects trips over
+        # batch_window minutes and solves one assignment problem
+        self.dispatch_mode = dispatch
+        self.batch_window = batch_window
         self.waiting_list = []
         self.simulation_time = simulation_time
         self.env = env
         self.trip_start = env.event()
-        self.demand_generated = []
+        # Trips, charging demand and observations go to this ResultsWriter, by default one writing to results/;
+        # trips are written when they are finished or missed, the ones still open when the results are saved
+        self.results = ResultsWriter('results') if results is None else results
+        self.open_trips = set()
         self.utilization = []
         self.vehicle_id = None
-        self.learner = RL_agent(env)
+        self.learner = RL_agent(env, q_table=q_table)
+        self.observer = FleetObserver(self.fleet, charging_stations, capacity=60, sink=self.results)
 
     def park(self, vehicle, parking):
         if self.env.now <= 5:
@@ -45,14 +82,14 @@ class Model:
             yield vehicle.parking_stop
         else:
             vehicle.mode = 'circling'
-            print(f'vehicle {vehicle.id} start circling at {self.env.now}')
+            tracer.event('start_circling', self.env.now, vehicle.id, zone=vehicle.position.id)
             circling_interruption = vehicle.circling_stop
             circling_finish = self.env.timeout(10)
             parking_events = yield circling_interruption | circling_finish
             if circling_interruption in parking_events:
-                print(f'vehicle {vehicle.id} interrupt circling at {self.env.now}')
+                tracer.event('interrupt_circling', self.env.now, vehicle.id, zone=vehicle.position.id)
             if circling_finish in parking_events:
-                print(f'vehicle {vehicle.id} stop circling at {self.env.now}')
+                tracer.event('stop_circling', self.env.now, vehicle.id, zone=vehicle.position.id)
                 vehicle.send_parking(parking)
                 yield self.env.timeout(vehicle.time_to_parking)
                 vehicle.parking(parking)
@@ -61,9 +98,7 @@ class Model:
     def parking_task(self, vehicle):
         if vehicle.mode in ['circling', 'idle']:
             # Finding the closest parking
-            distances_to_PKs = [vehicle.location.distance_1(PK.location) for PK in self.parkings]
-            parking = [x for x in self.parkings
-                       if x.location.distance_1(vehicle.location) == min(distances_to_PKs)][0]
+            parking = self.parkings[geo.nearest(vehicle.location, [PK.location for PK in self.parkings])]
             with parking.capacity.request() as req:
                 yield req
                 yield self.env.process(self.park(vehicle, parking))
@@ -75,22 +110,23 @@ class Model:
         vehicle.relocating_end.succeed()
         vehicle.relocating_end = self.env.event()
 
+    def zone_supply(self, zone):
+        # Idle and parked vehicles in the zone
+        return int(self.fleet.supply_of([zone.id])[0])
+
     def relocate_task(self, vehicle):
-        for zone in self.zones:
-            zone.update(self.vehicles)
         vehicle.position = find_zone(vehicle.location, self.zones)
         time = self.env.now
         for i in range(0, 24):
             if i * 60 <= time % 1440 <= (i + 1) * 60:
                 hour = i
-        if vehicle.charge_state >= 50 and vehicle.mode in ['idle', 'parking'] and len(
-                vehicle.position.list_of_vehicles) >= vehicle.position.demand.iloc[0, hour]:
-            target_zones = [z for z in self.zones if len(z.list_of_vehicles) <= z.demand.iloc[0, hour]]
+        if vehicle.charge_state >= 50 and vehicle.mode in ['idle', 'parking'] and \
+                self.zone_supply(vehicle.position) >= vehicle.position.demand[hour]:
+            supply = self.fleet.supply_of(self.zone_ids)
+            target_zones = [self.zones[i] for i in np.flatnonzero(supply <= self.zone_demand[:, hour]).tolist()]
 
             if len(target_zones) > 1:
-                distances_to_zones = [vehicle.location.distance_1(z.centre) for z in target_zones]
-                target_zone = [z for z in target_zones
-                               if z.centre.distance_1(vehicle.location) == min(distances_to_zones)][0]
+                target_zone = target_zones[geo.nearest(vehicle.location, [z.centre for z in target_zones])]
                 if vehicle.mode == 'parking':
                     vehicle.parking_stop.succeed()
                     vehicle.parking_stop = self.env.event()
@@ -98,16 +134,13 @@ class Model:
 
     def charging_interruption(self):
         while True:
-            for vehicle in self.vehicles:
-                if vehicle.mode == 'charging':
-                    vehicle.position = find_zone(vehicle.location, self.zones)
-                    vehicle.position.update(self.vehicles)
-                    soc = vehicle.charge_state + \
-                          (11 / 60 * (self.env.now - vehicle.t_start_charging) * 100) / vehicle.battery_capacity
-                    if soc > 50 and len([t for t in self.waiting_list
-                                         if t.mode == 'unassigned' and t.zone == vehicle.position]) >= 1:
-                        vehicle.charging_interruption.succeed()
-                        vehicle.charging_interruption = self.env.event()
+            for vehicle in self.fleet.select(self.fleet.mask('charging')):
+                vehicle.position = find_zone(vehicle.location, self.zones)
+                soc = vehicle.charge_state + \
+                      (11 / 60 * (self.env.now - vehicle.t_start_charging) * 100) / vehicle.battery_capacity
+                if soc > 50 and self.zone_waiting[vehicle.position.id] >= 1:
+                    vehicle.charging_interruption.succeed()
+                    vehicle.charging_interruption = self.env.event()
             yield self.env.timeout(15)
 
     def start_charge(self, charging_station, vehicle):
@@ -116,10 +149,10 @@ class Model:
                                time_start=self.env.now + vehicle.time_to_CS,
                                SOC=vehicle.charge_state, lat=vehicle.location.lat, long=vehicle.location.long,
                                v_hex=vehicle.position.hexagon,
-                               CS_location=[charging_station.location.lat, charging_station.location.long],
+                               CS_lat=charging_station.location.lat, CS_long=charging_station.location.long,
                                v_position=vehicle.position.id, CS_position=charging_station.id,
-                               distance=vehicle.location.distance(charging_station.location)[0])
-        self.demand_generated.append(charging_demand)
+                               distance=vehicle.distance_to_CS)
+        self.results.append('charging_demand', charging_demand)
         yield self.env.timeout(vehicle.time_to_CS)
         vehicle.t_start_charging = self.env.now
         vehicle.charging(charging_station)
@@ -140,7 +173,8 @@ class Model:
             vehicle.charging_interrupt.succeed()
             vehicle.charging_interrupt = self.env.event()
             vehicle.costs['charging'] += (vehicle.charging_threshold - vehicle.charge_state) * vehicle.charging_cost
-            print(f'Warning!!!Charging state of vehicle {vehicle.id} is {vehicle.charge_state} at {self.env.now} ')
+            tracer.event('charging_interrupted', self.env.now, vehicle.id, zone=charging_station.id,
+                         SOC=vehicle.charge_state)
 
     # Checking charge status for vehicles and send them to charge if necessary
     '''def charge_task(self, vehicle):
@@ -164,14 +198,13 @@ class Model:
                     charging.interrupt()
                     print(f'Vehicle {vehicle.id} stop charging at {self.env.now}')'''
 
-    def charge_task(self, vehicle):
+    def charge_task(self, vehicle, state=None):
         if self.env.now > 30:
-            action = self.learner.take_action(vehicle, self.vehicles, self.waiting_list)
+            action = self.learner.take_action(vehicle, self.vehicles, self.waiting_list, state)
             if action == 0 and vehicle.mode == 'idle':
                 # Finding the closest charging station
-                distances_to_CSs = [vehicle.location.distance_1(CS.location) for CS in self.charging_stations]
-                charging_station = [x for x in self.charging_stations
-                                    if x.location.distance_1(vehicle.location) == min(distances_to_CSs)][0]
+                charging_station = self.charging_stations[
+                    geo.nearest(vehicle.location, [CS.location for CS in self.charging_stations])]
                 with charging_station.plugs.request() as req:
                     yield self.env.process(self.start_charge(charging_station, vehicle))
                     yield req
@@ -179,12 +212,13 @@ class Model:
                     yield charging | vehicle.charging_interruption
                     if not charging.triggered:
                         charging.interrupt()
-                        print(f'Vehicle {vehicle.id} stop charging at {self.env.now}')
+                        tracer.event('stop_charging', self.env.now, vehicle.id, zone=charging_station.id)
             self.learner.update_value(vehicle, self.vehicles, self.waiting_list)
 
     def take_trip(self, trip, vehicle):
         vehicle.send(trip)
         trip.mode = 'assigned'
+        self.zone_waiting[trip.zone.id] -= 1
         self.waiting_list.remove(trip)
         yield self.env.timeout(vehicle.time_to_pickup)
         vehicle.pick_up(trip)
@@ -195,17 +229,20 @@ class Model:
         vehicle.trip_end = self.env.event()
         self.vehicle_id = vehicle.id
         trip.mode = 'finished'
+        self.record_trip(trip)
 
     def trip_task(self, trip):
-        available_vehicles = available_vehicle(self.vehicles, trip)
-        distances = [vehicle.location.distance_1(trip.origin) for vehicle in available_vehicles]
+        available_vehicles = available_vehicle(self.vehicles, trip, index=self.dispatchable)
         # If there is no available vehicle, add the trip to the waiting list
         if len(available_vehicles) == 0:
             return
         # Assigning the closest available vehicle to the trip
-        print(f'There is/are {len(available_vehicles)} available vehicle(s) for trip {trip.id}')
-        vehicle = [x for x in available_vehicles
-                   if x.location.distance_1(trip.origin) == min(distances)][0]
+        tracer.event('vehicles_available', self.env.now, trip=trip.id, zone=trip.zone.id,
+                     count=len(available_vehicles))
+        vehicle = available_vehicles[0]
+        self.assign(trip, vehicle)
+
+    def assign(self, trip, vehicle):
         if vehicle.mode == 'parking':
             vehicle.parking_stop.succeed()
             vehicle.parking_stop = self.env.event()
@@ -221,39 +258,104 @@ class Model:
             j += 1
             trip = Trip(self.env, [zone.id, j], zone)
             yield self.env.timeout(trip.interarrival)
-            self.trip_start.succeed()
-            self.trip_start = self.env.event()
-            trip.info['arrival_time'] = self.env.now
-            self.waiting_list.append(trip)
-            print(f'Trip {trip.id} is received at {self.env.now}')
-            trip.start_time = self.env.now
-
-    def missed_trip(self):
-        while True:
-            for trip in self.waiting_list:
-                if trip.mode == 'unassigned' and self.env.now > (trip.start_time + 15):
-                    trip.mode = 'missed'
-                    self.waiting_list.remove(trip)
-                    for vehicle in self.vehicles:
-                        if vehicle.location.distance_1(trip.origin) <= 15:
-                            vehicle.reward['missed_trips'] += 1
-                    print(f'trip {trip.id} is missed at {self.env.now}')
-            yield self.env.timeout(1)
+            self.receive(trip)
+
+    def trip_arrivals(self, source):
+        # One process for the trips of all zones, taken in time order from a source such as TripStream
+        counts = dict()
+        for arrival in source:
+            if arrival.time > self.env.now:
+                yield self.env.timeout(arrival.time - self.env.now)
+            counts[arrival.zone.id] = counts.get(arrival.zone.id, 0) + 1
+            trip = Trip(self.env, [arrival.zone.id, counts[arrival.zone.id]], arrival.zone, arrival.origin,
+                        arrival.zone_destination, arrival.destination)
+            self.receive(trip)
+
+    def receive(self, trip):
+        self.trip_start.succeed()
+        self.trip_start = self.env.event()
+        trip.info['arrival_time'] = self.env.now
+        self.waiting_list.append(trip)
+        self.open_trips.add(trip)
+        self.zone_waiting[trip.zone.id] += 1
+        tracer.event('trip_received', self.env.now, trip=trip.id, zone=trip.zone.id)
+        trip.start_time = self.env.now
+        self.schedule_expiry(trip)
+
+    def schedule_expiry(self, trip):
+        # Each trip is checked exactly once, when its maximum waiting time is over
+        deadline = self.env.timeout(self.max_waiting)
+        deadline.callbacks.append(lambda event: self.missed_trip(trip))
+
+    def missed_trip(self, trip):
+        if trip.mode != 'unassigned':
+            return
+        trip.mode = 'missed'
+        self.zone_waiting[trip.zone.id] -= 1
+        self.waiting_list.remove(trip)
+        self.record_trip(trip)
+        # Vehicles close to the missed trip share the penalty
+        rows, _ = self.nearby.query(trip.origin.lat, trip.origin.long, 15)
+        for row in rows.tolist():
+            self.fleet.vehicles[row].reward['missed_trips'] += 1
+        tracer.event('trip_missed', self.env.now, trip=trip.id, zone=trip.zone.id)
+
+    def record_trip(self, trip):
+        self.open_trips.discard(trip)
+        self.results.append('trips', trip_record(trip))
 
     def hourly_charging(self):
         while True:
-            for vehicle in self.vehicles:
-                if vehicle.mode in ['idle', 'parking']:
-                    self.env.process(self.charge_task(vehicle))
+            rows = np.flatnonzero(self.fleet.mask('idle', 'parking'))
+            # The states of all these vehicles are encoded together
+            states = [None] * len(rows)
+            if self.env.now > 30:
+                states = [tuple(state) for state in
+                          self.learner.get_states(self.fleet, rows, self.vehicles, self.waiting_list).tolist()]
+            for row, state in zip(rows.tolist(), states):
+                self.env.process(self.charge_task(self.fleet.vehicles[row], state))
             yield self.env.timeout(60)
 
+    def assign_waiting_trips(self):
+        # Greedy dispatch of the waiting trips; in batch mode batch_dispatch takes care of them
+        if self.dispatch_mode != 'greedy':
+            return
+        for trip in self.waiting_list:
+            if trip.mode == 'unassigned':
+                self.trip_task(trip)
+                yield self.env.timeout(0.001)
+
     def run(self):
         while True:
             yield self.trip_start
-            for trip in self.waiting_list:
-                if trip.mode == 'unassigned':
-                    self.trip_task(trip)
-                    yield self.env.timeout(0.001)
+            yield from self.assign_waiting_trips()
+
+    def batch_dispatch(self, SOC_threshold=20, max_distance=10):
+        # Every batch_window minutes, match all waiting trips to vehicles at minimum total pickup distance
+        while True:
+            yield self.env.timeout(self.batch_window)
+            trips = [t for t in self.waiting_list if t.mode == 'unassigned']
+            if len(trips) == 0:
+                continue
+            candidates = set()
+            for trip in trips:
+                candidates.update(self.dispatchable.query(trip.origin.lat, trip.origin.long, max_distance)[0].tolist())
+            if len(candidates) == 0:
+                continue
+            rows = np.array(sorted(candidates), dtype=np.intp)
+            fleet = self.fleet
+            lats, longs = geo.coordinates([t.origin for t in trips])
+            distance_to_pickup = geo.distance_matrix(lats, longs, fleet.lat[rows], fleet.long[rows])
+            distance_to_dropoff = np.array([t.distance for t in trips])[:, None]
+            charge_consumption = (distance_to_pickup + distance_to_dropoff) * \
+                                 fleet.fuel_consumption[rows] * 100.0 / fleet.battery_capacity[rows]
+            feasible = (distance_to_pickup <= max_distance) & \
+                       (charge_consumption + SOC_threshold <= fleet.charge_state[rows])
+            # Infeasible pairs get a prohibitive cost, so the solver first maximises the number of matches
+            cost = np.where(feasible, distance_to_pickup, 1e6)
+            for i, j in zip(*linear_sum_assignment(cost)):
+                if feasible[i, j]:
+                    self.assign(trips[i], fleet.vehicles[rows[j]])
 
     def run_vehicle(self, vehicle):
         while True:
@@ -275,87 +377,62 @@ class Model:
                         yield self.env.timeout(0.001)'''
 
             if event_trip_end in events:
-                print(f'A vehicle get idle at {self.env.now}')
+                tracer.event('vehicle_idle', self.env.now, vehicle.id)
                 self.env.process(self.charge_task(vehicle))
                 yield self.env.timeout(0.001)
                 self.relocate_task(vehicle)
                 yield self.env.timeout(0.001)
-                for trip in self.waiting_list:
-                    if trip.mode == 'unassigned':
-                        self.trip_task(trip)
-                        yield self.env.timeout(0.001)
+                yield from self.assign_waiting_trips()
                 self.env.process(self.parking_task(vehicle))
                 yield self.env.timeout(0.001)
 
             if event_charging_end in events:
-                print(f'A vehicle get charged at {self.env.now}')
+                tracer.event('vehicle_charged', self.env.now, vehicle.id)
                 self.relocate_task(vehicle)
-                for trip in self.waiting_list:
-                    if trip.mode == 'unassigned':
-                        self.trip_task(trip)
-                        yield self.env.timeout(0.001)
+                yield from self.assign_waiting_trips()
                 self.env.process(self.parking_task(vehicle))
                 yield self.env.timeout(0.001)
 
             if event_charging_interrupt in events:
-                print(f'Charging get interrupted at {self.env.now}')
-                for trip in self.waiting_list:
-                    if trip.mode == 'unassigned':
-                        self.trip_task(trip)
-                        yield self.env.timeout(0.001)
+                tracer.event('vehicle_uncharged', self.env.now, vehicle.id, zone=vehicle.position.id)
+                yield from self.assign_waiting_trips()
                 self.env.process(self.parking_task(vehicle))
                 yield self.env.timeout(0.001)
 
             if event_relocating_end in events:
-                print(f'vehicle {vehicle.id} finish relocating at {self.env.now}')
-                for trip in self.waiting_list:
-                    if trip.mode == 'unassigned':
-                        self.trip_task(trip)
-                        yield self.env.timeout(0.001)
+                tracer.event('finish_relocating', self.env.now, vehicle.id, zone=vehicle.position.id)
+                yield from self.assign_waiting_trips()
                 self.env.process(self.parking_task(vehicle))
                 yield self.env.timeout(0.001)
 
-    def obs_Ve(self, vehicle):
+    def observe(self, interval=1):
+        # One snapshot of all vehicles and charging stations every interval minutes
         while True:
-            t_now = self.env.now
-            self.t.append(t_now)
-            vehicle.info['SOC'].append(vehicle.charge_state)
-            vehicle.info['location'].append([vehicle.location.lat, vehicle.location.long])
-            vehicle.info['position'].append(vehicle.position)
-            vehicle.info['mode'].append(vehicle.mode)
-            yield self.env.timeout(1)
-
-    def obs_CS(self, charging_station):
-        while True:
-            charging_station.queue.append(charging_station.plugs.count)
-            yield self.env.timeout(1)
+            self.observer.snapshot(self.env.now)
+            yield self.env.timeout(interval)
 
     def obs_PK(self, parking):
         while True:
             parking.queue.append(parking.capacity.count)
             yield self.env.timeout(1)
 
-    def save_results(self, iteration):
-        trips_info = []
-        for i in self.waiting_list:
-            trips_info.append(i.info)
-        results = pd.DataFrame(trips_info)
-        results_charging_demand = pd.DataFrame(self.demand_generated)
-        '''results_q_table = pd.DataFrame(self.learner.q_table)
-        results_q_table.to_csv('q_table.csv')'''
-        with pd.ExcelWriter("results.xlsx", engine="openpyxl", mode='a') as writer:
-            results.to_excel(writer, sheet_name=f'Trips{iteration}')
-            results_charging_demand.to_excel(writer, sheet_name=f'demand_generated{iteration}')
-
-            pd_ve = pd.DataFrame()
-            for j in self.vehicles:
-                pd_ve = pd_ve.append(pd.DataFrame([j.info["mode"]]))
-            pd_ve.to_excel(writer, sheet_name=f'Vehicle_{iteration}')
-
-            pd_cs = pd.DataFrame()
-            for c in self.charging_stations:
-                pd_cs = pd_cs.append([c.queue])
-            pd_cs.to_excel(writer, sheet_name=f'CS_{iteration}')
-
-            """for p in self.parkings:
-                pd.DataFrame([p.queue]).to_excel(writer, sheet_name='PK_%s' % p.id)"""
+    def learn(self, interval=15):
+        # Transitions collected by the learner are applied to the Q-table in one batch every interval minutes
+        while True:
+            yield self.env.timeout(interval)
+            self.learner.learn()
+
+    def checkpoint(self, path, interval=60):
+        # Periodically persist the Q-table so that an interrupted run can be resumed
+        while True:
+            yield self.env.timeout(interval)
+            self.learner.q_table.save(path)
+
+    def save_results(self, iteration, excel=None):
+        # Completes and closes the results of this run; with excel, the results are also added to that workbook
+        for trip in sorted(self.open_trips, key=lambda t: t.info['arrival_time']):
+            self.record_trip(trip)
+        self.observer.flush()
+        self.results.close()
+        if excel is not None:
+            export_excel(self.results.directory, excel, iteration)
@@ -0,0 +1,37 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from Fleet_sim.geo import EARTH_RADIUS
+
+
+class NodeIndex:
+    """KD-tree over the road network nodes for nearest-node snapping.
+
+    Coordinates are projected onto a local equirectangular plane around the mean
+    latitude of the network, which is accurate to well below a metre over a city.
+    """
+
+    def __init__(self, nodes, lat, long):
+        self.nodes = np.asarray(nodes)
+        self.lat = np.asarray(lat, dtype=float)
+        self.long = np.asarray(long, dtype=float)
+        self.lat0 = float(self.lat.mean()) if len(self.lat) else 0.0
+        self.tree = cKDTree(self.project(self.lat, self.long))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def project(self, lat, long):
+        lat = np.radians(np.asarray(lat, dtype=float))
+        long = np.radians(np.asarray(long, dtype=float))
+        return np.column_stack((EARTH_RADIUS * long * np.cos(np.radians(self.lat0)), EARTH_RADIUS * lat))
+
+    def nearest(self, lats, longs):
+        # Positions of the nearest nodes in self.nodes and the snapping distances in km
+        distances, positions = self.tree.query(self.project(np.atleast_1d(lats), np.atleast_1d(longs)))
+        return positions, distances
+
+    def nearest_nodes(self, lats, longs):
+        return self.nodes[self.nearest(lats, longs)[0]]
+
+    def nearest_node(self, lat, long):
+        return self.nearest_nodes(lat, long)[0].item()
@@ -0,0 +1,118 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from Fleet_sim.charging_env import ChargingEnv, train
+from Fleet_sim.Q_learner import RL_agent
+from Fleet_sim.q_table import QTable, random_values
+
+
+def create_shared_table(path, shape, n_actions=2, initial=None, chunk=1 << 20, rng=None):
+    # A dense table in a .npy file that all workers map; filled chunk by chunk so it never has to fit in memory,
+    # and seeded with the states of the initial (e.g. lazy) table. The other states are drawn from rng
+    n_states = int(np.prod(shape, dtype=np.int64))
+    values = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n_states, n_actions))
+    for start in range(0, n_states, chunk):
+        stop = min(start + chunk, n_states)
+        values[start:stop] = random_values(stop - start, n_actions, rng=rng)
+    if initial is not None:
+        records = initial.records()
+        if initial.lazy:
+            values[records['state']] = records['q']
+        else:
+            values[:] = records
+    values.flush()
+    del values
+    return QTable.load(path, shape, mmap_mode='r+')
+
+
+def train_worker(shared_path, seed, episodes, env_options):
+    # Trains from the shared table, mapped copy-on-write, with a SeedSequence as seed and returns what it
+    # changed: the updated entries (flat state index * n_actions + action), how often each was updated and
+    # their new values
+    q_table = QTable.load(shared_path, RL_agent.state_shape, mmap_mode='c')
+    env_seed, rng_seed = seed.spawn(2)
+    visits = []
+    train(q_table, ChargingEnv(seed=env_seed, **env_options), episodes, rng=np.random.default_rng(rng_seed),
+          visits=visits)
+    if not visits:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=q_table.dtype)
+    keys, inverse = np.unique(np.concatenate([k for k, _ in visits]), return_inverse=True)
+    counts = np.bincount(inverse.reshape(-1), weights=np.concatenate([c for _, c in visits]))
+    return keys, counts, q_table.values.reshape(-1)[keys]
+
+
+def merge(shared, updates):
+    # Visit-count-weighted average of the workers' values for every entry any of them updated; other entries
+    # keep their shared value
+    keys = np.concatenate([k for k, _, _ in updates])
+    counts = np.concatenate([c for _, c, _ in updates])
+    values = np.concatenate([v for _, _, v in updates]).astype(float)
+    entries, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    weight = np.bincount(inverse, weights=counts)
+    flat = shared.values.reshape(-1)
+    flat[entries] = (np.bincount(inverse, weights=counts * values) / weight).astype(shared.dtype)
+    shared.values.flush()
+    return entries
+
+
+def write_back(shared, states, q_table=None):
+    # The shared values of the given states written into q_table, which keeps its other states, or into a new
+    # lazy table
+    result = QTable(shared.shape) if q_table is None else q_table
+    rows = result.rows_at(states)
+    result.values[rows] = shared.values[states]
+    return result
+
+
+def train_parallel(workers=None, rounds=10, episodes=2, seed=None, q_table=None, shared_path='q_table_shared.npy',
+                   env_options=None):
+    """Q-learning on ChargingEnv in several processes that share one table.
+
+    Every round each worker trains ``episodes`` episodes with its own seed, starting
+    from the shared table, and the updated entries are merged back into it. The states
+    that were updated are written into ``q_table``, which is returned; without one, a
+    new lazy table holding only those states is returned.
+    """
+    workers = workers or os.cpu_count()
+    env_options = env_options or dict()
+    table_seed, *seeds = np.random.SeedSequence(seed).spawn(rounds * workers + 1)
+    # The unvisited entries start random, as in a new QTable
+    shared = create_shared_table(shared_path, RL_agent.state_shape, initial=q_table,
+                                 rng=np.random.default_rng(table_seed))
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    visited = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for r in range(rounds):
+                round_seeds = seeds[r * workers:(r + 1) * workers]
+                updates = list(pool.map(train_worker, [shared_path] * workers, round_seeds,
+                                        [episodes] * workers, [env_options] * workers))
+                visited.append(merge(shared, updates) // shared.n_actions)
+        states = np.unique(np.concatenate(visited)) if visited else np.empty(0, np.int64)
+        return write_back(shared, states, q_table)
+    finally:
+        del shared
+        os.remove(shared_path)
+
+
+if __name__ == '__main__':
+    # python -m Fleet_sim.parallel_training --workers 8 --rounds 20
+    parser = argparse.ArgumentParser(description='Train the charging Q-table with parallel learners')
+    parser.add_argument('--workers', type=int, default=None, help='learner processes (default: all cores)')
+    parser.add_argument('--rounds', type=int, default=10, help='merge rounds')
+    parser.add_argument('--episodes', type=int, default=2, help='episodes per worker and round')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--q-table', default='q_table.npy', help='table to start from and to save')
+    args = parser.parse_args()
+    initial = None
+    if os.path.exists(args.q_table):
+        initial = QTable.load(args.q_table, RL_agent.state_shape, mmap_mode=None)
+    start = time.time()
+    q_table = train_parallel(args.workers, args.rounds, args.episodes, args.seed, initial)
+    print(f'Trained {len(q_table)} states in {time.time() - start:.1f}s')
+    q_table.save(args.q_table)
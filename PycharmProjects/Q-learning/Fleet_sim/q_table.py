@@ -0,0 +1,165 @@
+import os
+import numpy as np
+
+
+def random_values(n_rows, n_actions, dtype=np.float32, rng=None):
+    # Same initialisation as the old dict table: uniform in [-1, 0) rounded to two decimals
+    rng = np.random if rng is None else rng
+    return np.round(rng.uniform(-1, 0, size=(n_rows, n_actions)), 2).astype(dtype)
+
+
+class QTable:
+    """Q-values stored in one contiguous float32 array with integer state indexing.
+
+    A state is a tuple of integers, one per dimension of ``shape``. Components outside
+    the table are clipped to its border. With ``lazy=True`` only the states that are
+    actually visited get a row, so memory grows with the explored part of the state
+    space instead of its full size. Rows returned by ``table[state]`` are NumPy views
+    and can be written in place, e.g. ``table[state][action] = q``; in lazy mode such
+    a view is only valid until the next unseen state is added.
+
+    Tables are persisted as a single ``.npy`` file (see ``save``/``load``) so that a
+    later run can memory-map them instead of reading them into memory.
+    """
+
+    def __init__(self, shape, n_actions=2, lazy=True, dtype=np.float32, initial_rows=4096):
+        self.initial_rows = initial_rows
+        self.shape = tuple(int(d) for d in shape)
+        self.n_actions = n_actions
+        self.lazy = lazy
+        self.dtype = np.dtype(dtype)
+        self.n_states = int(np.prod(self.shape, dtype=np.int64))
+        if lazy:
+            self.rows = dict()  # flat state index -> row in self.values
+            self.values = np.empty((initial_rows, n_actions), dtype=self.dtype)
+            self.size = 0
+        else:
+            self.rows = None
+            self.values = random_values(self.n_states, n_actions, self.dtype)
+            self.size = self.n_states
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, state):
+        row = self.row(state)  # may grow self.values, so look it up first
+        return self.values[row]
+
+    def __setitem__(self, state, q_values):
+        row = self.row(state)
+        self.values[row] = q_values
+
+    def index(self, state):
+        idx = 0
+        for s, d in zip(state, self.shape):
+            s = int(s)
+            if s < 0:
+                s = 0
+            elif s >= d:
+                s = d - 1
+            idx = idx * d + s
+        return idx
+
+    def index_many(self, states):
+        states = np.asarray(states, dtype=np.int64).reshape(-1, len(self.shape))
+        states = np.clip(states, 0, np.array(self.shape) - 1)
+        return np.ravel_multi_index(states.T, self.shape)
+
+    def row(self, state):
+        idx = self.index(state)
+        if not self.lazy:
+            return idx
+        row = self.rows.get(idx)
+        if row is None:
+            row = self._add(idx)
+        return row
+
+    def rows_many(self, states):
+        return self.rows_at(self.index_many(states))
+
+    def rows_at(self, idx):
+        # Rows of flat state indices, as returned by index/index_many
+        idx = np.asarray(idx, dtype=np.int64)
+        if not self.lazy:
+            return idx
+        # Each distinct state is looked up once
+        unique, inverse = np.unique(idx, return_inverse=True)
+        rows = np.empty(len(unique), dtype=np.int64)
+        for i, flat in enumerate(unique.tolist()):
+            row = self.rows.get(flat)
+            if row is None:
+                row = self._add(flat)
+            rows[i] = row
+        return rows[inverse.reshape(-1)]
+
+    def update(self, idx, actions, rewards, next_idx, alpha=0.1, gamma=0.5):
+        # Batched Q-learning update of transitions between flat state indices; updates of the same state and
+        # action are averaged. Returns the updated entries (row * n_actions + action) and how often each was hit
+        rows = self.rows_at(idx)
+        next_rows = self.rows_at(next_idx)  # may grow self.values, so index it afterwards
+        target = rewards + gamma * self.values[next_rows].max(axis=1)
+        delta = alpha * (target - self.values[rows, actions])
+        keys, inverse = np.unique(rows * self.n_actions + actions, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        mean_delta = np.bincount(inverse, weights=delta) / np.bincount(inverse)
+        self.values[keys // self.n_actions, keys % self.n_actions] += mean_delta.astype(self.dtype)
+        return keys, np.bincount(inverse)
+
+    def _add(self, idx):
+        if self.size == len(self.values):
+            # A loaded table may have no rows at all
+            grown = np.empty((max(2 * len(self.values), self.initial_rows, 1), self.n_actions), dtype=self.dtype)
+            grown[:self.size] = self.values[:self.size]
+            self.values = grown
+        row = self.size
+        self.values[row] = random_values(1, self.n_actions, self.dtype)[0]
+        self.rows[idx] = row
+        self.size += 1
+        return row
+
+    def records(self):
+        # Lazy tables are stored as (state, q) records, dense ones as the plain value array
+        if not self.lazy:
+            return self.values
+        records = np.empty(self.size, dtype=[('state', np.int64), ('q', self.dtype, (self.n_actions,))])
+        keys = np.empty(self.size, dtype=np.int64)
+        keys[list(self.rows.values())] = list(self.rows.keys())
+        records['state'] = keys
+        records['q'] = self.values[:self.size]
+        return records
+
+    def save(self, path):
+        # Write to a temporary file and rename it so that readers never see a partial table; a table mapped from
+        # path keeps its mapping of the old file
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            np.lib.format.write_array(f, self.records(), allow_pickle=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, shape, mmap_mode='c'):
+        # Mapped copy-on-write by default, so updates never reach the file before save; 'r+' writes them through
+        data = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+        lazy = data.dtype.names is not None
+        n_actions = data.dtype['q'].shape[0] if lazy else data.shape[1]
+        table = cls.__new__(cls)
+        table.shape = tuple(int(d) for d in shape)
+        table.n_actions = n_actions
+        table.lazy = lazy
+        table.n_states = int(np.prod(table.shape, dtype=np.int64))
+        table.initial_rows = 4096
+        if lazy:
+            table.dtype = data.dtype['q'].base
+            table.values = data['q']
+            table.size = len(data)
+            table.rows = dict(zip(np.asarray(data['state']).tolist(), range(table.size)))
+        else:
+            if len(data) != table.n_states:
+                raise ValueError(f'{path} holds {len(data)} states, expected {table.n_states}')
+            table.dtype = data.dtype
+            table.values = data
+            table.rows = None
+            table.size = table.n_states
+        return table
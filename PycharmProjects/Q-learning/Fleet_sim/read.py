@@ -1,18 +1,32 @@
+import numpy as np
 import pandas as pd
 
 from Fleet_sim.Zone import Zone
 demand_table = pd.read_csv('demand_table.csv')
 OD_table = pd.read_csv('origin_destination.csv')
 
-z = 0
+hexagons = demand_table['h3_hexagon_id_start'].values
+# Trips per hour, one row per zone
+demand = demand_table.drop('h3_hexagon_id_start', axis=1).to_numpy(dtype=float)
+# The OD table holds cumulative destination probabilities in no particular column order; reorder it to the
+# zone order, then sort every row so that destinations can be drawn with a binary search
+OD = OD_table.set_index('h3_hexagon_id_start').loc[hexagons, hexagons].to_numpy(dtype=float)
+destination_order = np.argsort(OD, axis=1, kind='stable')
+destination_cdf = np.take_along_axis(OD, destination_order, axis=1)
+destination_cdf /= destination_cdf[:, -1:]
+
 zones = list()
-for hex in demand_table['h3_hexagon_id_start'].values:
-    z += 1
-    '''demand = (demand_table[demand_table['h3_hexagon_id_start'] == hex]
-                  .drop('h3_hexagon_id_start', axis=1))/1440 + 0.001'''
-    demand = (demand_table[demand_table['h3_hexagon_id_start'] == hex]).drop('h3_hexagon_id_start', axis=1)
-    destination = (OD_table[OD_table['h3_hexagon_id_start'] == hex]
-                   .drop('h3_hexagon_id_start', axis=1)).sort_values(by=z - 1, axis=1).T.reset_index()
-    zone = Zone(z, hex, demand, destination)
+for z, hex in enumerate(hexagons):
+    zone = Zone(z + 1, hex, z, demand, destination_order, destination_cdf)
     zones.append(zone)
+# Zone ids of the charging stations (one at each of these zone centres) and their numbers of chargers
+charging_station_zones = [3, 11, 15, 18, 27, 36, 40, 42, 45, 52, 59, 65, 73, 74, 86, 88]
+charging_station_plugs = [4, 3, 6, 5, 4, 3, 3, 4, 4, 5, 4, 5, 3, 5, 8, 4]
 charging_threshold = [40, 45, 50, 55, 52, 50, 48, 45, 45, 42, 40, 40, 40, 40, 40, 38, 35, 32, 30, 30, 27, 30, 32, 35]
+
+
+def sample_destinations(origins, u):
+    # Destination zone indices for origin zone indices and uniform draws u in (0, 1]
+    cdf = destination_cdf[origins]
+    k = np.minimum((cdf < np.asarray(u)[:, None]).sum(axis=1), cdf.shape[1] - 1)
+    return destination_order[origins, k]
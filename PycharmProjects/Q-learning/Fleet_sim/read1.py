@@ -1,10 +1,37 @@
-import osmnx as ox
+import atexit
+from Fleet_sim.road_graph import RoadGraph
+from Fleet_sim.route_cache import RouteCache
 
-G = ox.io.load_graphml('./mynetwork.graphml')
-'''bbox = [52.10, 52.80, 13.00, 13.80]
-G = ox.graph_from_bbox(bbox[1], bbox[0], bbox[3], bbox[2], network_type='drive', retain_all=False,
-                       truncate_by_edge=True, simplify=False)'''
+graphml_path = './mynetwork.graphml'
+compiled_path = './mynetwork_csr'
 
-'''G = ox.graph_from_place('Berlin, Germany', network_type='drive', buffer_dist=5000, retain_all=False)'''
-G = ox.add_edge_speeds(G)
-G = ox.add_edge_travel_times(G)
+
+def load_graph(path=graphml_path):
+    import osmnx as ox
+    G = ox.io.load_graphml(path)
+    '''bbox = [52.10, 52.80, 13.00, 13.80]
+    G = ox.graph_from_bbox(bbox[1], bbox[0], bbox[3], bbox[2], network_type='drive', retain_all=False,
+                           truncate_by_edge=True, simplify=False)'''
+
+    '''G = ox.graph_from_place('Berlin, Germany', network_type='drive', buffer_dist=5000, retain_all=False)'''
+    G = ox.add_edge_speeds(G)
+    G = ox.add_edge_travel_times(G)
+    return G
+
+
+# The GraphML file is only parsed to (re)compile the graph; routing runs on the compiled arrays,
+# which are not read before the first route is requested
+road_graph = RoadGraph(compiled_path, graphml_path)
+
+# Routes between snapped nodes, shared by all runs on this network
+route_cache = RouteCache('./mynetwork_routes.sqlite')
+atexit.register(route_cache.close)
+
+
+def __getattr__(name):
+    # The networkx graph is still available as read1.G, parsed on first access
+    if name == 'G':
+        global G
+        G = load_graph()
+        return G
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
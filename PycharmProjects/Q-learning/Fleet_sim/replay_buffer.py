@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """Transitions (state, action, reward, next state) in preallocated arrays.
+
+    States are flat Q-table indices (QTable.index). The buffer is a ring: once
+    ``capacity`` transitions are stored the oldest are overwritten. ``fresh`` counts
+    the transitions appended since they were last taken with ``take_fresh``;
+    ``sample`` draws from everything stored, for experience replay.
+    """
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.state = np.zeros(capacity, dtype=np.int64)
+        self.action = np.zeros(capacity, dtype=np.int8)
+        self.reward = np.zeros(capacity, dtype=np.float32)
+        self.next_state = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.position = 0
+        self.fresh = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, state, action, reward, next_state):
+        # Returns True once capacity fresh transitions are waiting, i.e. before any would be lost
+        i = self.position
+        self.state[i] = state
+        self.action[i] = action
+        self.reward[i] = reward
+        self.next_state[i] = next_state
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.fresh = min(self.fresh + 1, self.capacity)
+        return self.fresh == self.capacity
+
+    def _take(self, i):
+        return self.state[i], self.action[i], self.reward[i], self.next_state[i]
+
+    def take_fresh(self):
+        i = (self.position - self.fresh + np.arange(self.fresh)) % self.capacity
+        self.fresh = 0
+        return self._take(i)
+
+    def sample(self, n, rng=None):
+        rng = np.random.default_rng() if rng is None else rng
+        return self._take(rng.integers(0, self.size, n))
@@ -0,0 +1,134 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from Fleet_sim.fleet_state import MODES
+
+modes_type = pa.dictionary(pa.int8(), pa.string())
+
+# Long-format tables written by a run, one Parquet file each
+schemas = dict(
+    trips=pa.schema([('zone', pa.int32()), ('number', pa.int32()),
+                     ('origin_lat', pa.float64()), ('origin_long', pa.float64()),
+                     ('destination_lat', pa.float64()), ('destination_long', pa.float64()),
+                     ('origin_zone', pa.int32()), ('destination_zone', pa.int32()),
+                     ('arrival_time', pa.float64()), ('pickup_time', pa.float64()),
+                     ('waiting_time', pa.float64()), ('status', pa.string())]),
+    charging_demand=pa.schema([('vehicle_id', pa.int32()), ('time_send', pa.float64()),
+                               ('time_start', pa.float64()), ('SOC', pa.float64()),
+                               ('lat', pa.float64()), ('long', pa.float64()), ('v_hex', pa.string()),
+                               ('CS_lat', pa.float64()), ('CS_long', pa.float64()),
+                               ('v_position', pa.int32()), ('CS_position', pa.int32()),
+                               ('distance', pa.float64())]),
+    vehicles=pa.schema([('time', pa.float64()), ('vehicle_id', pa.int32()), ('SOC', pa.float32()),
+                        ('lat', pa.float32()), ('long', pa.float32()), ('zone', pa.int16()),
+                        ('mode', modes_type)]),
+    stations=pa.schema([('time', pa.float64()), ('station_id', pa.int32()), ('plugs', pa.int16())]),
+)
+
+
+def trip_record(trip):
+    info = trip.info
+    return dict(zone=info['id'][0], number=info['id'][1],
+                origin_lat=info['origin'][0], origin_long=info['origin'][1],
+                destination_lat=info['destination'][0], destination_long=info['destination'][1],
+                origin_zone=info['origin_zone'], destination_zone=info['destination_zone'],
+                arrival_time=info['arrival_time'], pickup_time=info['pickup_time'],
+                waiting_time=info['waiting_time'], status=trip.mode)
+
+
+def modes_array(codes):
+    return pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int8()), pa.array(MODES))
+
+
+class ResultsWriter:
+    """Results of one run streamed to ``<directory>/<table>.parquet``.
+
+    Rows are buffered per table and written as a row group once ``chunk_rows``
+    of them are pending, so memory stays bounded however long the run is.
+    ``append`` takes one record (a dict), ``write`` a dict of equally long columns.
+    """
+
+    def __init__(self, directory, chunk_rows=50000):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+        self.writers = dict()
+        self.records = {name: [] for name in schemas}
+        self.batches = {name: [] for name in schemas}
+        self.pending = {name: 0 for name in schemas}
+
+    def path(self, table):
+        return os.path.join(self.directory, f'{table}.parquet')
+
+    def append(self, table, record):
+        self.records[table].append(record)
+        self._added(table, 1)
+
+    def write(self, table, columns):
+        batch = pa.Table.from_pydict(columns, schema=schemas[table])
+        self.batches[table].append(batch)
+        self._added(table, len(batch))
+
+    def _added(self, table, n):
+        self.pending[table] += n
+        if self.pending[table] >= self.chunk_rows:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in [table] if table is not None else list(schemas):
+            parts = list(self.batches[name])
+            if self.records[name]:
+                parts.append(pa.Table.from_pylist(self.records[name], schema=schemas[name]))
+            self.records[name] = []
+            self.batches[name] = []
+            self.pending[name] = 0
+            if not parts:
+                continue
+            if name not in self.writers:
+                self.writers[name] = pq.ParquetWriter(self.path(name), schemas[name])
+            self.writers[name].write_table(pa.concat_tables(parts))
+
+    def close(self):
+        self.flush()
+        for name, schema in schemas.items():
+            # Tables without any row are still written, so every run has the same files
+            if name not in self.writers:
+                self.writers[name] = pq.ParquetWriter(self.path(name), schema)
+            self.writers[name].close()
+        self.writers = dict()
+
+
+def read_table(directory, table):
+    return pd.read_parquet(os.path.join(directory, f'{table}.parquet'))
+
+
+def export_excel(directory, path, iteration=0):
+    # Post-processing: the sheets results.xlsx used to get, with vehicle modes and occupied plugs
+    # pivoted to one column per observation
+    mode = 'a' if os.path.exists(path) else 'w'
+    with pd.ExcelWriter(path, engine='openpyxl', mode=mode) as writer:
+        read_table(directory, 'trips').to_excel(writer, sheet_name=f'Trips{iteration}')
+        read_table(directory, 'charging_demand').to_excel(writer, sheet_name=f'demand_generated{iteration}')
+        vehicles = read_table(directory, 'vehicles')
+        vehicles.pivot(index='vehicle_id', columns='time', values='mode').to_excel(
+            writer, sheet_name=f'Vehicle_{iteration}')
+        stations = read_table(directory, 'stations')
+        stations.pivot(index='station_id', columns='time', values='plugs').to_excel(
+            writer, sheet_name=f'CS_{iteration}')
+
+
+def merge_results(directories, directory, replications=None):
+    # One Parquet file per table with the rows of all runs, tagged with their replication number; row groups
+    # are copied one at a time
+    replications = range(len(directories)) if replications is None else replications
+    os.makedirs(directory, exist_ok=True)
+    for table, schema in schemas.items():
+        merged_schema = pa.schema([('replication', pa.int32())] + list(schema))
+        with pq.ParquetWriter(os.path.join(directory, f'{table}.parquet'), merged_schema) as writer:
+            for replication, source in zip(replications, directories):
+                parquet_file = pq.ParquetFile(os.path.join(source, f'{table}.parquet'))
+                for i in range(parquet_file.num_row_groups):
+                    rows = parquet_file.read_row_group(i)
+                    column = pa.array([replication] * len(rows), type=pa.int32())
+                    writer.write_table(rows.add_column(0, 'replication', column).cast(merged_schema))
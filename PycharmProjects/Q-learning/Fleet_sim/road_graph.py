@@ -0,0 +1,174 @@
+import math
+import os
+from heapq import heappush, heappop
+import numpy as np
+from Fleet_sim.geo import EARTH_RADIUS
+from Fleet_sim.node_index import NodeIndex
+
+ARRAYS = ('node_ids', 'lat', 'long', 'indptr', 'indices', 'length', 'travel_time')
+
+
+def compile_graph(G, path):
+    """Write the road graph as CSR arrays, one memory-mappable .npy file per array.
+
+    Edge ``length`` is in metres and ``travel_time`` in seconds, as produced by
+    osmnx. Of several parallel edges only the fastest one is kept.
+    """
+    node_ids = np.array(list(G.nodes), dtype=np.int64)
+    position = {n: i for i, n in enumerate(node_ids.tolist())}
+    fastest = dict()
+    for u, v, data in G.edges(data=True):
+        key = (position[u], position[v])
+        if key not in fastest or data['travel_time'] < fastest[key][1]:
+            fastest[key] = (data['length'], data['travel_time'])
+    edges = sorted(fastest.items())
+    tails = np.array([e[0][0] for e in edges], dtype=np.int64)
+    arrays = dict(
+        node_ids=node_ids,
+        lat=np.array([G.nodes[n]['y'] for n in G.nodes], dtype=float),
+        long=np.array([G.nodes[n]['x'] for n in G.nodes], dtype=float),
+        indptr=np.searchsorted(tails, np.arange(len(node_ids) + 1)).astype(np.int64),
+        indices=np.array([e[0][1] for e in edges], dtype=np.int32),
+        length=np.array([e[1][0] for e in edges], dtype=np.float32),
+        travel_time=np.array([e[1][1] for e in edges], dtype=np.float32))
+    os.makedirs(path, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(path, f'{name}.npy'), arrays[name])
+
+
+class RoadGraph:
+    """Routing over a compiled road graph.
+
+    Nothing is read until the first query; the arrays are then memory-mapped from
+    ``path``. If ``path`` is missing or older than ``graphml_path``, the GraphML file
+    is parsed once and compiled.
+    """
+
+    def __init__(self, path, graphml_path=None):
+        self.path = path
+        self.graphml_path = graphml_path
+        self.arrays = None
+        self.lists = None
+        self._node_index = None
+        self.max_speed = None
+
+    def load(self):
+        # Reads the graph and builds its node index now instead of on the first query, e.g. before forking
+        # processes that should share them
+        self._load()
+        self.node_index
+        return self
+
+    def _load(self):
+        if self.arrays is None:
+            if self._stale():
+                from Fleet_sim.read1 import load_graph
+                compile_graph(load_graph(self.graphml_path), self.path)
+            self.arrays = {name: np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+                           for name in ARRAYS}
+        return self.arrays
+
+    def _stale(self):
+        marker = os.path.join(self.path, 'indptr.npy')
+        if not os.path.exists(marker):
+            return True
+        return self.graphml_path is not None and os.path.exists(self.graphml_path) and \
+            os.path.getmtime(marker) < os.path.getmtime(self.graphml_path)
+
+    def __len__(self):
+        return len(self._load()['node_ids'])
+
+    @property
+    def node_ids(self):
+        return self._load()['node_ids']
+
+    @property
+    def node_index(self):
+        if self._node_index is None:
+            arrays = self._load()
+            self._node_index = NodeIndex(np.arange(len(arrays['node_ids'])), arrays['lat'], arrays['long'])
+        return self._node_index
+
+    def nearest_nodes(self, lats, longs):
+        # Positions of the nearest nodes, as used by route and single_source
+        return self.node_index.nearest_nodes(lats, longs)
+
+    def _adjacency(self):
+        # Plain lists are much faster than NumPy scalars inside the search loop
+        if self.lists is None:
+            arrays = self._load()
+            self.lists = tuple(arrays[name].tolist() for name in ('indptr', 'indices', 'length', 'travel_time',
+                                                                   'lat', 'long'))
+            length = arrays['length']
+            travel_time = arrays['travel_time']
+            moving = travel_time > 0
+            self.max_speed = float((length[moving] / travel_time[moving]).max()) if moving.any() else 1.0
+        return self.lists
+
+    def route(self, orig, dest):
+        """A* on travel time from node position ``orig`` to ``dest``.
+
+        Returns ``[distance in km, duration in min]`` of the fastest route, or None if
+        ``dest`` cannot be reached.
+        """
+        indptr, indices, length, travel_time, lat, long = self._adjacency()
+        lat_d = math.radians(lat[dest])
+        long_d = math.radians(long[dest])
+        cos_d = math.cos(lat_d)
+        max_speed = self.max_speed
+
+        def heuristic(u):
+            # Great-circle distance at the top speed of the network never overestimates
+            lat_u = math.radians(lat[u])
+            a = math.sin((lat_d - lat_u) / 2) ** 2 + \
+                math.cos(lat_u) * cos_d * math.sin((long_d - math.radians(long[u])) / 2) ** 2
+            return 2000 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a))) / max_speed
+
+        best = {orig: 0.0}
+        heap = [(heuristic(orig), 0.0, 0.0, orig)]
+        while heap:
+            _, t, l, u = heappop(heap)
+            if u == dest:
+                return [l / 1000, t / 60]
+            if t > best[u]:
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                t_v = t + travel_time[e]
+                if t_v < best.get(v, math.inf):
+                    best[v] = t_v
+                    heappush(heap, (t_v + heuristic(v), t_v, l + length[e], v))
+        return None
+
+    def single_source(self, orig):
+        """Dijkstra on travel time from ``orig`` to every node.
+
+        Returns distances in km and durations in min along the fastest routes, with
+        inf for unreachable nodes.
+        """
+        indptr, indices, length, travel_time, _, _ = self._adjacency()
+        n = len(indptr) - 1
+        best_time = [math.inf] * n
+        best_length = [math.inf] * n
+        best_time[orig] = 0.0
+        best_length[orig] = 0.0
+        heap = [(0.0, 0.0, orig)]
+        while heap:
+            t, l, u = heappop(heap)
+            if t > best_time[u]:
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                t_v = t + travel_time[e]
+                if t_v < best_time[v]:
+                    best_time[v] = t_v
+                    best_length[v] = l + length[e]
+                    heappush(heap, (t_v, best_length[v], v))
+        return np.array(best_length) / 1000, np.array(best_time) / 60
+
+
+if __name__ == '__main__':
+    # One-time compile step: python -m Fleet_sim.road_graph
+    from Fleet_sim.read1 import load_graph, graphml_path, compiled_path
+    compile_graph(load_graph(graphml_path), compiled_path)
+    print(f'Compiled {graphml_path} to {compiled_path}')
@@ -0,0 +1,81 @@
+import sqlite3
+from collections import OrderedDict
+
+
+class RouteCache:
+    """Distance/duration of routes between snapped road nodes.
+
+    Recently used routes are kept in a bounded in-memory LRU; every route is also
+    written to a SQLite file so that later runs on the same network start warm.
+    """
+
+    def __init__(self, path=None, maxsize=100000, commit_every=50):
+        self.routes = OrderedDict()
+        self.maxsize = maxsize
+        self.commit_every = commit_every
+        self.pending = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.path = path
+        self.db = None
+        self.open()
+
+    def open(self):
+        # (Re)connect to the SQLite file, e.g. in a worker process; connections must not cross a fork
+        if self.path is not None and self.db is None:
+            self.db = sqlite3.connect(self.path, timeout=30)
+            self.db.execute('CREATE TABLE IF NOT EXISTS routes (orig INTEGER, dest INTEGER, distance REAL, '
+                            'duration REAL, PRIMARY KEY (orig, dest)) WITHOUT ROWID')
+            self.db.commit()
+
+    def __len__(self):
+        return len(self.routes)
+
+    def get(self, orig, dest):
+        key = (orig, dest)
+        distance_duration = self.routes.get(key)
+        if distance_duration is not None:
+            self.routes.move_to_end(key)
+            self.hits += 1
+            return list(distance_duration)
+        if self.db is not None:
+            row = self.db.execute('SELECT distance, duration FROM routes WHERE orig = ? AND dest = ?',
+                                  key).fetchone()
+            if row is not None:
+                self._remember(key, row)
+                self.disk_hits += 1
+                return list(row)
+        self.misses += 1
+        return None
+
+    def put(self, orig, dest, distance_duration):
+        key = (orig, dest)
+        self._remember(key, tuple(distance_duration))
+        if self.db is not None:
+            self.db.execute('INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?)', (*key, *distance_duration))
+            self.pending += 1
+            if self.pending >= self.commit_every:
+                self.commit()
+
+    def _remember(self, key, distance_duration):
+        self.routes[key] = distance_duration
+        self.routes.move_to_end(key)
+        if len(self.routes) > self.maxsize:
+            self.routes.popitem(last=False)
+
+    def commit(self):
+        if self.db is not None and self.pending:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        if self.db is not None:
+            self.commit()
+            self.db.close()
+            self.db = None
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return dict(hits=self.hits, disk_hits=self.disk_hits, misses=self.misses, size=len(self.routes),
+                    hit_rate=(self.hits + self.disk_hits) / lookups if lookups else 0.0)
@@ -0,0 +1,134 @@
+import atexit
+import logging
+import string
+import sys
+import numpy as np
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+OFF = logging.CRITICAL + 10
+
+# Event types, in the order of their codes: name, level and message. Messages may use time, vehicle, trip and
+# zone, plus the extra fields passed by the caller, which are not kept in trace files
+EVENTS = [
+    ('trip_received', INFO, 'Trip {trip} is received at {time}'),
+    ('trip_missed', INFO, 'trip {trip} is missed at {time}'),
+    ('vehicles_available', DEBUG, 'There is/are {count} available vehicle(s) for trip {trip}'),
+    ('vehicle_sent', INFO, 'Vehicle {vehicle} is sent to the request {trip}'),
+    ('pick_up', INFO, 'Vehicle {vehicle} pick up the user {trip} at {time}'),
+    ('drop_off', INFO, 'Vehicle {vehicle} drop off the user {trip} at {time}'),
+    ('vehicle_idle', DEBUG, 'Vehicle {vehicle} get idle at {time}'),
+    ('send_charge', INFO, 'Vehicle {vehicle} with charging state {SOC} is sent to the charging station {zone} at '
+                          '{time}'),
+    ('start_charging', INFO, 'Vehicle {vehicle} start charging at {time}'),
+    ('finish_charging', INFO, 'Charging state of vehicle {vehicle} is {SOC} at {time}'),
+    ('vehicle_charged', DEBUG, 'Vehicle {vehicle} get charged at {time}'),
+    ('stop_charging', INFO, 'Vehicle {vehicle} stop charging at {time}'),
+    ('charging_interrupted', WARNING, 'Warning!!!Charging state of vehicle {vehicle} is {SOC} at {time}'),
+    ('relocate', INFO, 'Vehicle {vehicle} is relocated to the zone {zone}'),
+    ('finish_relocating', DEBUG, 'vehicle {vehicle} finish relocating at {time}'),
+    ('send_parking', INFO, 'Vehicle {vehicle} is sent to the parking {parking} at {time}'),
+    ('start_parking', INFO, 'Vehicle {vehicle} start parking at {time}'),
+    ('start_circling', INFO, 'vehicle {vehicle} start circling at {time}'),
+    ('interrupt_circling', DEBUG, 'vehicle {vehicle} interrupt circling at {time}'),
+    ('stop_circling', DEBUG, 'vehicle {vehicle} stop circling at {time}'),
+    ('vehicle_uncharged', DEBUG, 'Charging of vehicle {vehicle} get interrupted at {time}'),
+]
+EVENT_CODES = {name: code for code, (name, _, _) in enumerate(EVENTS)}
+EVENT_LEVELS = {name: level for name, level, _ in EVENTS}
+EVENT_MESSAGES = {name: message for name, _, message in EVENTS}
+
+# One record of a trace file; -1 where an event has no vehicle, trip or zone. Trips are identified by their
+# origin zone and number, charging events carry the station id as zone
+TRACE_DTYPE = np.dtype([('time', '<f8'), ('event', 'u1'), ('vehicle', '<i4'), ('trip_zone', '<i4'),
+                        ('trip_number', '<i4'), ('zone', '<i2')])
+
+
+class Tracer:
+    """Simulation events, printed from ``level`` upwards and optionally recorded in a trace file.
+
+    Messages are only formatted for events that are printed. With a trace file
+    (``open``) every event, whatever its level, is added to a preallocated record
+    buffer that is written out in blocks of ``chunk`` records; ``read_trace``
+    decodes such a file.
+    """
+
+    def __init__(self, level=WARNING, stream=None, chunk=65536):
+        self.level = level
+        self.stream = stream
+        self.chunk = chunk
+        self.file = None
+        self.records = None
+        self.size = 0
+
+    def set_level(self, level):
+        self.level = level
+
+    def open(self, path):
+        self.close()
+        self.file = open(path, 'wb')
+        self.records = np.zeros(self.chunk, dtype=TRACE_DTYPE)
+        self.size = 0
+
+    def event(self, name, time, vehicle=-1, trip=None, zone=-1, **fields):
+        if EVENT_LEVELS[name] >= self.level:
+            message = EVENT_MESSAGES[name].format(time=time, vehicle=vehicle, trip=trip, zone=zone, **fields)
+            (self.stream or sys.stdout).write(message + '\n')
+        if self.records is not None:
+            record = self.records[self.size]
+            record['time'] = time
+            record['event'] = EVENT_CODES[name]
+            record['vehicle'] = vehicle
+            record['trip_zone'], record['trip_number'] = trip if trip is not None else (-1, -1)
+            record['zone'] = zone
+            self.size += 1
+            if self.size == self.chunk:
+                self.flush()
+
+    def flush(self):
+        if self.file is not None and self.size:
+            self.file.write(self.records[:self.size].tobytes())
+            self.size = 0
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+        self.file = None
+        self.records = None
+
+
+def read_trace(path):
+    # The records of a trace file as a DataFrame, with event names instead of codes
+    import pandas as pd
+    records = pd.DataFrame(np.fromfile(path, dtype=TRACE_DTYPE))
+    records['event'] = pd.Categorical.from_codes(records['event'], [name for name, _, _ in EVENTS])
+    return records
+
+
+class _Unknown(dict):
+    def __missing__(self, key):
+        return '?'
+
+
+def messages(path):
+    # The messages of a trace file; fields that are not recorded are shown as ?
+    formatter = string.Formatter()
+    for record in np.fromfile(path, dtype=TRACE_DTYPE):
+        name = EVENTS[record['event']][0]
+        trip = [int(record['trip_zone']), int(record['trip_number'])] if record['trip_zone'] >= 0 else None
+        fields = _Unknown(time=float(record['time']), vehicle=int(record['vehicle']), trip=trip,
+                          zone=int(record['zone']))
+        yield formatter.vformat(EVENT_MESSAGES[name], (), fields)
+
+
+# The tracer of the simulation; silent apart from warnings until configured
+tracer = Tracer()
+atexit.register(tracer.close)
+
+
+if __name__ == '__main__':
+    # Print the messages of a trace file: python -m Fleet_sim.tracer results/0/trace.bin
+    for line in messages(sys.argv[1]):
+        print(line)
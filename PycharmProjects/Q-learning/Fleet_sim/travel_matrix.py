@@ -0,0 +1,75 @@
+import numpy as np
+from h3 import h3
+
+
+class TravelMatrix:
+    """Road distance (km) and travel time (min) between a fixed set of points.
+
+    Rows are addressed by the exact (lat, long) of a point. Points that carry an H3
+    hexagon (zone centres) can also be used to answer for any location inside that
+    hexagon, which is how the matrix serves trip origins and destinations.
+    """
+
+    def __init__(self, lat, long, distance, duration, hexagons=None):
+        self.lat = np.asarray(lat, dtype=float)
+        self.long = np.asarray(long, dtype=float)
+        self.distance = np.asarray(distance, dtype=np.float32)
+        self.duration = np.asarray(duration, dtype=np.float32)
+        self.hexagons = [] if hexagons is None else [str(h) for h in hexagons]
+        self.rows = {(la, lo): i for i, (la, lo) in enumerate(zip(self.lat.tolist(), self.long.tolist()))}
+        self.hex_rows = {h: i for i, h in enumerate(self.hexagons) if h}
+        self.resolution = h3.h3_get_resolution(next(iter(self.hex_rows))) if self.hex_rows else None
+
+    def __len__(self):
+        return len(self.lat)
+
+    def row(self, loc, snap=False):
+        i = self.rows.get((loc.lat, loc.long))
+        if i is None and snap and self.hex_rows:
+            i = self.hex_rows.get(h3.geo_to_h3(loc.lat, loc.long, self.resolution))
+        return i
+
+    def lookup(self, orig, dest, snap=False):
+        i = self.row(orig, snap)
+        j = self.row(dest, snap)
+        if i is None or j is None or (i == j and snap):
+            # Unknown point, or both points snapped into the same hexagon
+            return None
+        return [float(self.distance[i, j]), float(self.duration[i, j])]
+
+    def save(self, path):
+        np.savez(path, lat=self.lat, long=self.long, distance=self.distance, duration=self.duration,
+                 hexagons=np.array(self.hexagons, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            hexagons = data['hexagons'].tolist() if 'hexagons' in data else None
+            return cls(data['lat'], data['long'], data['distance'], data['duration'], hexagons)
+
+
+def build_travel_matrix(road_graph, locations, hexagons=None):
+    # One Dijkstra per origin over the compiled road graph instead of one shortest path per pair
+    from Fleet_sim.location import Location
+    nodes = road_graph.nearest_nodes([loc.lat for loc in locations], [loc.long for loc in locations])
+    n = len(locations)
+    distance = np.empty((n, n), dtype=np.float32)
+    duration = np.empty((n, n), dtype=np.float32)
+    for i, orig in enumerate(nodes.tolist()):
+        distance[i], duration[i] = (a[nodes] for a in road_graph.single_source(orig))
+        for j in np.flatnonzero(np.isinf(duration[i])).tolist():
+            # Same fallback as Location.distance when there is no route
+            dis = Location.distance_1(locations[i], locations[j])
+            distance[i, j] = dis
+            duration[i, j] = dis / 0.5
+    return TravelMatrix([loc.lat for loc in locations], [loc.long for loc in locations],
+                        distance, duration, hexagons)
+
+
+if __name__ == '__main__':
+    # Build the zone-centre matrix once: python -m Fleet_sim.travel_matrix
+    from Fleet_sim.read1 import road_graph
+    from Fleet_sim.read import zones
+    matrix = build_travel_matrix(road_graph, [z.centre for z in zones], [z.hexagon for z in zones])
+    matrix.save('travel_matrix.npz')
+    print(f'Saved a {len(matrix)}x{len(matrix)} travel matrix to travel_matrix.npz')
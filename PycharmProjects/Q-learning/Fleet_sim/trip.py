@@ -1 +1,61 @@
-import randomfrom Fleet_sim.location import Location, generate_randomimport numpy as npfrom Fleet_sim.read import zonesfrom Fleet_sim.vehicle import Vehicleclass Trip:    def __init__(self, env, id, zone):        self.env = env        self.id = id        self.zone = zone        # We generate origin and destination of trips randomly        time = self.env.now        self.origin = generate_random(zone.hexagon)        r = random.uniform(0, 1)        for i in range(1, 88):            if zone.destination.iloc[i-1, 1] < r <= zone.destination.iloc[i, 1]:                zone_destination_hex = zone.destination.iloc[i, 0]        zone_destination = [z for z in zones if z.hexagon == zone_destination_hex][0]        self.destination = generate_random(zone_destination.hexagon)        for i in range(0, 24):            if i*60 <= time%1440 <= (i+1)*60:                demand = zone.demand[str(i)].values        # We generate time-varying trips (i.e. trips are being generated exponentially, in which        # arrival-rate is a gaussian function of time during the day)        if demand == 0:            arrival_rate = 1440        else:            arrival_rate = 60/demand        self.interarrival = random.expovariate(1/arrival_rate)        self.start_time = None        distance_duration = self.origin.distance(self.destination)        self.distance = distance_duration[0]        self.duration = distance_duration[1]        self.end_time = self.interarrival + self.duration        self.mode = 'unassigned'        self.info = dict()        self.info['id'] = self.id        self.info['origin'] = [self.origin.lat, self.origin.long]        self.info['destination'] = [self.destination.lat, self.destination.long]        self.info['origin_zone'] = zone.id        self.info['destination_zone'] = zone_destination.id        self.info['arrival_time'] = None        self.info['pickup_time'] = None        self.info['waiting_time'] = None    """    Allowed modes are:    unassigned - no vehicle is assigned to it    assigned - a vehicle is assigned and sent    in vehicle - it is being served    finished - it is finished   """
\ No newline at end of file
+import random
+from Fleet_sim.location import Location, generate_random
+import numpy as np
+
+from Fleet_sim.read import zones, sample_destinations
+from Fleet_sim.vehicle import Vehicle
+
+
+class Trip:
+
+    def __init__(self, env, id, zone, origin=None, zone_destination=None, destination=None):
+        self.env = env
+        self.id = id
+        self.zone = zone
+
+        if origin is None:
+            # We generate origin and destination of trips randomly
+            time = self.env.now
+            origin = generate_random(zone.hexagon)
+            r = random.uniform(0, 1)
+            zone_destination = zones[sample_destinations([zone.index], [r])[0]]
+            destination = generate_random(zone_destination.hexagon)
+            for i in range(0, 24):
+                if i*60 <= time%1440 <= (i+1)*60:
+                    demand = zone.demand[i]
+
+            # We generate time-varying trips (i.e. trips are being generated exponentially, in which
+            # arrival-rate is a gaussian function of time during the day)
+            if demand == 0:
+                arrival_rate = 1440
+            else:
+                arrival_rate = 60/demand
+            self.interarrival = random.expovariate(1/arrival_rate)
+        else:
+            # Origin and destination come pre-sampled from a trip source (see Fleet_sim.trip_stream)
+            self.interarrival = 0
+        self.origin = origin
+        self.destination = destination
+        self.start_time = None
+        distance_duration = self.origin.distance(self.destination)
+        self.distance = distance_duration[0]
+        self.duration = distance_duration[1]
+        self.end_time = self.interarrival + self.duration
+
+        self.mode = 'unassigned'
+        self.info = dict()
+        self.info['id'] = self.id
+        self.info['origin'] = [self.origin.lat, self.origin.long]
+        self.info['destination'] = [self.destination.lat, self.destination.long]
+        self.info['origin_zone'] = zone.id
+        self.info['destination_zone'] = zone_destination.id
+        self.info['arrival_time'] = None
+        self.info['pickup_time'] = None
+        self.info['waiting_time'] = None
+
+    """
+    Allowed modes are:
+    unassigned - no vehicle is assigned to it
+    assigned - a vehicle is assigned and sent
+    in vehicle - it is being served
+    finished - it is finished   """
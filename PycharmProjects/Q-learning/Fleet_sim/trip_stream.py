@@ -0,0 +1,182 @@
+import itertools
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from Fleet_sim.location import Location, find_zone, random_points
+from Fleet_sim.read import sample_destinations
+
+Arrival = namedtuple('Arrival', ['time', 'zone', 'origin', 'zone_destination', 'destination'])
+
+
+class TripStream:
+    """Trip arrivals of all zones merged into one time-ordered stream.
+
+    Arrivals follow a non-homogeneous Poisson process whose rate is constant within
+    each hour and given by the zones' hourly demand (trips per hour), like the
+    per-zone exponential interarrival times of Model.trip_generation. They are
+    sampled ``chunk`` minutes at a time from a generator seeded with ``seed``, so a
+    replication is reproducible. ``zones`` are the zones of Fleet_sim.read, whose
+    positions match the rows of its demand and OD arrays.
+    """
+
+    def __init__(self, zones, seed=None, chunk=60, start=0):
+        self.zones = zones
+        self.rng = np.random.default_rng(seed)
+        self.chunk = chunk
+        self.start = start
+        demand = np.stack([z.demand for z in zones])
+        # Arrivals per minute; zones without demand still get a trip a day on average
+        self.rates = np.where(demand == 0, 1 / 1440, demand / 60)
+
+    def sample(self, t0, t1):
+        # All arrivals in [t0, t1), sorted by time
+        times = []
+        zone_indices = []
+        hour_start = t0
+        while hour_start < t1:
+            hour_end = min(t1, (hour_start // 60 + 1) * 60)
+            hour = int(hour_start // 60) % 24
+            counts = self.rng.poisson(self.rates[:, hour] * (hour_end - hour_start))
+            zone_indices.append(np.repeat(np.arange(len(self.zones)), counts))
+            times.append(self.rng.uniform(hour_start, hour_end, counts.sum()))
+            hour_start = hour_end
+        times = np.concatenate(times)
+        zone_indices = np.concatenate(zone_indices)
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        zone_indices = zone_indices[order]
+        origins = np.array([z.index for z in self.zones])[zone_indices]
+        destinations = sample_destinations(origins, self.rng.uniform(0, 1, len(origins)))
+        return times, zone_indices, self.points(origins), destinations, self.points(destinations)
+
+    def points(self, zone_indices):
+        # A uniform point in each given zone, sampled zone by zone
+        lats = np.empty(len(zone_indices))
+        longs = np.empty(len(zone_indices))
+        hexagons = [z.hexagon for z in self.zones]
+        for z in np.unique(zone_indices).tolist():
+            rows = np.flatnonzero(zone_indices == z)
+            lats[rows], longs[rows] = random_points(hexagons[z], len(rows), self.rng)
+        return lats, longs
+
+    def __iter__(self):
+        t0 = self.start
+        while True:
+            times, zone_indices, (o_lat, o_long), destinations, (d_lat, d_long) = self.sample(t0, t0 + self.chunk)
+            for i in range(len(times)):
+                yield Arrival(times[i].item(), self.zones[zone_indices[i]], Location(o_lat[i].item(), o_long[i].item()),
+                              self.zones[destinations[i]], Location(d_lat[i].item(), d_long[i].item()))
+            t0 += self.chunk
+
+
+class TraceReplay:
+    """Trip arrivals replayed from a CSV or Parquet file, with the same interface as TripStream.
+
+    Two layouts are understood:
+
+    * trip records with columns ``time`` (minutes), ``origin_lat``, ``origin_long``,
+      ``destination_lat`` and ``destination_long``, sorted by time; they are read
+      ``chunksize`` rows at a time and injected at their recorded times;
+    * hourly counts per hexagon like demand.csv (``dt_start_hour``,
+      ``h3_hexagon_id_start``, ``id``); every hour's count is rounded (carrying the
+      remainder to the next hour) and spread evenly over the hour, trips start and end
+      at zone centres and destinations follow the OD quantiles, so nothing is random.
+      ``days`` repeats the profile. Only the counts per zone and hour are kept; a file
+      sorted by hour (judged by its first chunk) is replayed while it is read, other
+      files are counted through first.
+    """
+
+    def __init__(self, path, zones, chunksize=10000, days=1):
+        self.path = path
+        self.zones = zones
+        self.chunksize = chunksize
+        self.days = days
+
+    def chunks(self):
+        if self.path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(self.path).iter_batches(batch_size=self.chunksize):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(self.path, chunksize=self.chunksize)
+
+    def __iter__(self):
+        chunks = self.chunks()
+        first = next(chunks, None)
+        if first is None:
+            return
+        if 'dt_start_hour' in first.columns:
+            yield from self.hourly(first, chunks)
+        else:
+            yield from self.records(first, chunks)
+
+    def records(self, first, chunks):
+        last_time = -np.inf
+        for chunk in itertools.chain([first], chunks):
+            times = chunk['time'].to_numpy(dtype=float)
+            if len(times) and (times[0] < last_time or np.any(np.diff(times) < 0)):
+                raise ValueError(f'{self.path} is not sorted by time')
+            for row in chunk.itertuples(index=False):
+                origin = Location(row.origin_lat, row.origin_long)
+                destination = Location(row.destination_lat, row.destination_long)
+                yield Arrival(row.time, find_zone(origin, self.zones), origin, find_zone(destination, self.zones),
+                              destination)
+            if len(times):
+                last_time = times[-1]
+
+    def hourly(self, first, chunks):
+        counts = np.zeros((len(self.zones), 24))
+        hours = first['dt_start_hour'].to_numpy(dtype=int) % 24
+        if np.all(np.diff(hours) >= 0):
+            # The hours before the last one read are complete; the last may continue in the next chunk
+            rounding = self.rounding()
+            next_hour = 0
+            for chunk in itertools.chain([first], chunks):
+                hours = chunk['dt_start_hour'].to_numpy(dtype=int) % 24
+                if not len(hours):
+                    continue
+                if hours[0] < next_hour or np.any(np.diff(hours) < 0):
+                    raise ValueError(f'{self.path} is not sorted by dt_start_hour beyond its first chunk')
+                self.count(chunk, counts)
+                for hour in range(next_hour, hours[-1]):
+                    yield from self.hour(0, hour, counts[:, hour], rounding)
+                next_hour = hours[-1]
+            for hour in range(next_hour, 24):
+                yield from self.hour(0, hour, counts[:, hour], rounding)
+            first_day = 1
+        else:
+            for chunk in itertools.chain([first], chunks):
+                self.count(chunk, counts)
+            first_day = 0
+        for day in range(first_day, self.days):
+            rounding = self.rounding()
+            for hour in range(24):
+                yield from self.hour(day, hour, counts[:, hour], rounding)
+
+    def count(self, chunk, counts):
+        zone_of = {z.hexagon: i for i, z in enumerate(self.zones)}
+        zone_indices = chunk['h3_hexagon_id_start'].map(zone_of).to_numpy(dtype=float)
+        known = ~np.isnan(zone_indices)
+        np.add.at(counts, (zone_indices[known].astype(int), chunk['dt_start_hour'].to_numpy(dtype=int)[known] % 24),
+                  chunk['id'].to_numpy(dtype=float)[known])
+
+    def rounding(self):
+        # Cumulative counts of the day per zone and the trips generated from them so far
+        return np.zeros(len(self.zones)), np.zeros(len(self.zones))
+
+    def hour(self, day, hour, counts, rounding):
+        # Round the cumulative counts so that fractional demand is carried over, not lost
+        total, generated = rounding
+        total += counts
+        n = (np.floor(total + 0.5) - generated).astype(int)
+        generated += n
+        zone_indices = np.repeat(np.arange(len(self.zones)), n)
+        k = np.concatenate([np.arange(m) for m in n]) if n.sum() else np.empty(0, dtype=int)
+        offsets = (k + 0.5) / np.repeat(np.maximum(n, 1), n)
+        times = (day * 24 + hour) * 60 + 60 * offsets
+        origins = np.array([z.index for z in self.zones])[zone_indices]
+        destinations = sample_destinations(origins, offsets)
+        for i in np.argsort(times, kind='stable').tolist():
+            zone = self.zones[zone_indices[i]]
+            zone_destination = self.zones[destinations[i]]
+            yield Arrival(times[i].item(), zone, zone.centre, zone_destination, zone_destination.centre)
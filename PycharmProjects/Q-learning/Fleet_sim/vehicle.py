@@ -1,21 +1,7 @@
-from Fleet_sim.location import find_zone
+from Fleet_sim.fleet_state import FleetState, MODES, MODE_CODES
+from Fleet_sim.location import Location, find_zone
 from Fleet_sim.read import zones
-import logging
-
-lg = logging.getLogger(__name__)
-lg.setLevel(logging.INFO)
-
-formatter = logging.Formatter('%(name)s:%(message)s')
-
-file_handler = logging.FileHandler('report.log')
-file_handler.setFormatter(formatter)
-
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(formatter)
-stream_handler.setLevel(logging.ERROR)
-
-lg.addHandler(file_handler)
-lg.addHandler(stream_handler)
+from Fleet_sim.tracer import tracer
 
 
 class Vehicle:
@@ -25,13 +11,13 @@ class Vehicle:
 
     # remove everything env related and put it into VehicleSimulation
 
-    def __init__(self, id, env, initial_location, capacity, charge_state, mode):
+    def __init__(self, id, env, initial_location, capacity, charge_state, mode, fleet=None):
         self.env = env
+        # Location, SOC, mode and position live in a row of the fleet store
+        self.fleet = None
+        self.row = None
+        self.bind(FleetState(1) if fleet is None else fleet)
         self.info = dict()
-        self.info['SOC'] = []
-        self.info['location'] = []
-        self.info['position'] = []
-        self.info['mode'] = []
         self.location = initial_location
         self.id = id
         self.mode = mode
@@ -100,6 +86,65 @@ class Vehicle:
         self.relocating_end = env.event()
         self.reward = dict(charging=0, distance=0, missed_trips=0)
 
+    def bind(self, fleet):
+        # Move this vehicle into another fleet store, keeping its current state
+        old_fleet, old_row = self.fleet, self.row
+        self.row = fleet.add(self)
+        self.fleet = fleet
+        if old_fleet is not None:
+            for name in FleetState.columns:
+                fleet.set(name, self.row, old_fleet.get(name, old_row))
+            fleet.zones_by_id.update(old_fleet.zones_by_id)
+
+    @property
+    def location(self):
+        return Location(self.fleet.get('lat', self.row), self.fleet.get('long', self.row))
+
+    @location.setter
+    def location(self, location):
+        self.fleet.set('lat', self.row, location.lat)
+        self.fleet.set('long', self.row, location.long)
+
+    @property
+    def charge_state(self):
+        return self.fleet.get('charge_state', self.row)
+
+    @charge_state.setter
+    def charge_state(self, charge_state):
+        self.fleet.set('charge_state', self.row, charge_state)
+
+    @property
+    def battery_capacity(self):
+        return self.fleet.get('battery_capacity', self.row)
+
+    @battery_capacity.setter
+    def battery_capacity(self, capacity):
+        self.fleet.set('battery_capacity', self.row, capacity)
+
+    @property
+    def fuel_consumption(self):
+        return self.fleet.get('fuel_consumption', self.row)
+
+    @fuel_consumption.setter
+    def fuel_consumption(self, fuel_consumption):
+        self.fleet.set('fuel_consumption', self.row, fuel_consumption)
+
+    @property
+    def mode(self):
+        return MODES[self.fleet.get('mode', self.row)]
+
+    @mode.setter
+    def mode(self, mode):
+        self.fleet.set('mode', self.row, MODE_CODES[mode])
+
+    @property
+    def position(self):
+        return self.fleet.zone_of(self.row)
+
+    @position.setter
+    def position(self, zone):
+        self.fleet.set_zone(self.row, zone)
+
     def send(self, trip):
         self.mode = 'locked'
         distance_duration = self.location.distance(trip.origin)
@@ -111,7 +156,7 @@ class Vehicle:
         self.charge_consumption_dropoff = distance_to_dropoff \
                                           * self.fuel_consumption * 100.0 / self.battery_capacity
         self.rental_time = trip.duration
-        print(f'Vehicle {self.id} is sent to the request {trip.id}')
+        tracer.event('vehicle_sent', self.env.now, self.id, trip.id, trip.zone.id)
 
         '''self.task_list.append({'mode': 'locked',
                                'duration': self.time_to_pickup,
@@ -133,7 +178,7 @@ class Vehicle:
 
     def pick_up(self, trip):
         self.mode = 'active'
-        print(f'Vehicle {self.id} pick up the user {trip.id} at {self.env.now}')
+        tracer.event('pick_up', self.env.now, self.id, trip.id, trip.zone.id)
         self.charge_state -= self.charge_consumption_pickup
         trip.info['pickup_time'] = self.env.now
         trip.info['waiting_time'] = trip.info['pickup_time'] - trip.info['arrival_time']
@@ -145,12 +190,11 @@ class Vehicle:
         self.location = trip.destination
         self.position = find_zone(self.location, zones)
         # self.count_times['idle'] += 1
-        print(f'Vehicle {self.id} drop off the user {trip.id} at {self.env.now}')
+        tracer.event('drop_off', self.env.now, self.id, trip.id, self.position.id)
 
     def send_charge(self, charging_station):
         self.mode = 'ertc'
-        print(f'Charging state of vehicle {self.id} is {self.charge_state}')
-        print(f'Vehicle {self.id} is sent to the charging station {charging_station.id} at {self.env.now}')
+        tracer.event('send_charge', self.env.now, self.id, zone=charging_station.id, SOC=self.charge_state)
         distance_duration = self.location.distance(charging_station.location)
         self.distance_to_CS = distance_duration[0]
         self.reward['distance'] = distance_duration[0]
@@ -182,7 +226,7 @@ class Vehicle:
                 (100 * charging_station.power))
         self.location = charging_station.location
         self.position = find_zone(self.location, zones)
-        print(f'Vehicle {self.id} start charging at {self.env.now}')
+        tracer.event('start_charging', self.env.now, self.id, zone=charging_station.id)
         """self.task_list.append({'mode': 'charging',
                                        'duration': self.charge_duration,
                                        'start time': self.env.now,
@@ -196,7 +240,7 @@ class Vehicle:
         self.reward['charging'] = (self.charging_threshold - self.charge_state)/100 * 50 * self.charging_cost
         self.costs['charging'] += (self.charging_threshold - self.charge_state)/100 * 50 * self.charging_cost
         self.charge_state += (charging_station.power * self.charge_duration * 100) / self.battery_capacity
-        print(f'Charging state of vehicle {self.id} is {self.charge_state} at {self.env.now} ')
+        tracer.event('finish_charging', self.env.now, self.id, zone=charging_station.id, SOC=self.charge_state)
         # self.count_seconds['charging'] += self.charge_duration
 
     def relocate(self, target_zone):
@@ -209,7 +253,7 @@ class Vehicle:
         self.charge_consumption_relocate = distance_to_target \
                                            * self.fuel_consumption * 100.0 / self.battery_capacity
 
-        print(f'Vehicle {self.id} is relocated to the zone {target_zone.id}')
+        tracer.event('relocate', self.env.now, self.id, zone=target_zone.id)
         self.mode = 'relocating'
 
         """self.task_list.append({'mode': 'relocating',
@@ -230,7 +274,7 @@ class Vehicle:
     def send_parking(self, parking):
         self.mode = 'ertp'
         if self.env.now != 0:
-            print(f'Vehicle {self.id} is sent to the parking {parking.id} at {self.env.now}')
+            tracer.event('send_parking', self.env.now, self.id, zone=self.position.id, parking=parking.id)
         distance_duration = self.location.distance(parking.location)
         self.distance_to_parking = distance_duration[0]
         self.time_to_parking = distance_duration[1]
@@ -247,4 +291,4 @@ class Vehicle:
         self.location = parking.location
         self.position = find_zone(self.location, zones)
         if self.env.now >= 5:
-            print(f'Vehicle {self.id} start parking at {self.env.now}')
+            tracer.event('start_parking', self.env.now, self.id, zone=self.position.id)
@@ -0,0 +1,81 @@
+import math
+from collections import defaultdict
+import numpy as np
+from Fleet_sim import geo
+from Fleet_sim.fleet_state import mode_codes
+
+
+class VehicleIndex:
+    """Grid of fleet rows for neighbourhood queries, optionally restricted to some modes.
+
+    The index follows the fleet store incrementally: the store reports every row
+    whose location or mode changes and ``refresh`` re-files only those rows. Cells
+    are ``cell_size`` km wide at latitude ``lat0``, by default the fleet's mean
+    latitude when the index is built.
+    """
+
+    def __init__(self, fleet, modes=None, cell_size=2.0, lat0=None):
+        self.fleet = fleet
+        self.codes = None if modes is None else mode_codes(modes)
+        if lat0 is None:
+            lat0 = float(fleet.lat.mean()) if len(fleet) else 0.0
+        self.dlat = cell_size / 111.2
+        self.dlong = cell_size / (111.32 * math.cos(math.radians(lat0)))
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.cell_of = dict()  # row -> cell of the rows currently indexed
+        self.dirty = fleet.track()
+        self.dirty.update(range(len(fleet)))
+        self.refresh()
+
+    def cell(self, lat, long):
+        return int(lat // self.dlat), int(long // self.dlong)
+
+    def refresh(self):
+        if not self.dirty:
+            return
+        rows = np.fromiter(self.dirty, dtype=np.intp, count=len(self.dirty))
+        self.dirty.clear()
+        lat = self.fleet.lat[rows]
+        long = self.fleet.long[rows]
+        if self.codes is None:
+            keep = np.ones(len(rows), dtype=bool)
+        else:
+            keep = np.isin(self.fleet.mode[rows], self.codes)
+        cell_lat = (lat // self.dlat).astype(int).tolist()
+        cell_long = (long // self.dlong).astype(int).tolist()
+        for row, k, c_lat, c_long in zip(rows.tolist(), keep.tolist(), cell_lat, cell_long):
+            old = self.cell_of.pop(row, None)
+            if old is not None:
+                self.cells[old].discard(row)
+            if k:
+                self.cell_of[row] = (c_lat, c_long)
+                self.cells[(c_lat, c_long)].add(row)
+
+    def __len__(self):
+        self.refresh()
+        return len(self.cell_of)
+
+    def query(self, lat, long, max_distance, k=None):
+        """Indexed rows within ``max_distance`` km of a point, closest first, with their distances."""
+        self.refresh()
+        c_lat, c_long = self.cell(lat, long)
+        # Cells are cell_size km wide in both directions; one extra ring covers the curvature
+        r = int(math.ceil(max_distance / self.cell_size)) + 1
+        candidates = []
+        for i in range(c_lat - r, c_lat + r + 1):
+            for j in range(c_long - r, c_long + r + 1):
+                bucket = self.cells.get((i, j))
+                if bucket:
+                    candidates.extend(bucket)
+        if not candidates:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        rows = np.sort(np.array(candidates, dtype=np.intp))
+        distances = geo.distances(lat, long, self.fleet.lat[rows], self.fleet.long[rows])
+        within = distances <= max_distance
+        rows = rows[within]
+        distances = distances[within]
+        order = np.argsort(distances, kind='stable')
+        if k is not None:
+            order = order[:k]
+        return rows[order], distances[order]
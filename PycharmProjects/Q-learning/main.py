@@ -1,15 +1,33 @@
 from Fleet_sim.charging_station import ChargingStation
-from Fleet_sim.location import Location
+from Fleet_sim.fleet_state import FleetState
+from Fleet_sim.location import Location, use_travel_matrix
 from Fleet_sim.model import Model
+import os
+import numpy as np
 import simpy
 import random
 from Fleet_sim.parking import Parking
-from Fleet_sim.read import zones
+from Fleet_sim.Q_learner import RL_agent
+from Fleet_sim.q_table import QTable
+from Fleet_sim.read import zones, charging_station_zones, charging_station_plugs
+from Fleet_sim.read1 import route_cache
+from Fleet_sim.results import ResultsWriter
+from Fleet_sim.tracer import tracer
+from Fleet_sim.travel_matrix import TravelMatrix
+from Fleet_sim.trip_stream import TripStream, TraceReplay
 from Fleet_sim.vehicle import Vehicle
 
+# Road distances between zones are answered from the matrix built by `python -m Fleet_sim.travel_matrix`
+if os.path.exists('travel_matrix.npz'):
+    use_travel_matrix(TravelMatrix.load('travel_matrix.npz'))
+
+
+def replication(iteration, seed=None, q_table=None, q_table_path='q_table.npy', results_dir='results'):
+    # One simulation run; with a seed its vehicles, parkings and trips are reproducible
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
 
-for iteration in range(1):
-    print(f'iteration:{iteration}')
     env = simpy.Environment()
 
     # Initialize Vehicles
@@ -27,6 +45,7 @@ for iteration in range(1):
         vehicles_data.append(vehicle_data)
 
     vehicles = list()
+    fleet = FleetState(len(vehicles_data))
 
     for data in vehicles_data:
         vehicle = Vehicle(
@@ -35,14 +54,15 @@ for iteration in range(1):
             data['initial_location'],
             data['capacity'],
             data['charge_state'],
-            data['mode']
+            data['mode'],
+            fleet
         )
         vehicles.append(vehicle)
     # Initializing charging stations
 
     CSs_data = []
-    CSs_optimum = [z for z in zones if z.id in [3, 11, 15, 18, 27, 36, 40, 42, 45, 52, 59, 65, 73, 74, 86, 88]]
-    c = [4, 3, 6, 5, 4, 3, 3, 4, 4, 5, 4, 5, 3, 5, 8, 4]
+    CSs_optimum = [z for z in zones if z.id in charging_station_zones]
+    c = charging_station_plugs
     CSs_zones = []
     for s in range(len(c)):
         CSs_zones.append(dict(base=CSs_optimum[s], Number_of_chargers=c[s]))
@@ -90,34 +110,61 @@ for iteration in range(1):
 
     # Run simulation
     sim = Model(env, vehicles=vehicles, charging_stations=charging_stations, zones=zones, parkings=parkings,
-                simulation_time=1440 * 0.1)
-    for zone in zones:
-        env.process(sim.trip_generation(zone=zone))
-    env.process(sim.run())
+                simulation_time=1440 * 0.1, q_table=q_table, dispatch='greedy',
+                results=ResultsWriter(os.path.join(results_dir, str(iteration))))
+    # Every event goes to <results_dir>/<iteration>/trace.bin, decoded by python -m Fleet_sim.tracer; only
+    # warnings are printed unless the level is lowered, e.g. tracer.set_level(INFO) from Fleet_sim.tracer
+    tracer.open(os.path.join(results_dir, str(iteration), 'trace.bin'))
+    # Trips of all zones come from one pre-sampled stream, seeded per iteration
+    env.process(sim.trip_arrivals(TripStream(zones, seed=iteration if seed is None else seed)))
+    # Replaying the hourly demand of demand.csv instead gives every run the same trips:
+    # env.process(sim.trip_arrivals(TraceReplay('Fleet_sim/demand.csv', zones)))
+    '''for zone in zones:
+        env.process(sim.trip_generation(zone=zone))'''
+    if sim.dispatch_mode == 'batch':
+        env.process(sim.batch_dispatch())
+    else:
+        env.process(sim.run())
     for vehicle in vehicles:
         env.process(sim.run_vehicle(vehicle))
 
     env.process(sim.hourly_charging())
     env.process(sim.charging_interruption())
 
-    for vehicle in vehicles:
-        env.process(sim.obs_Ve(vehicle=vehicle))
-
-    for charging_station in charging_stations:
-        env.process(sim.obs_CS(charging_station=charging_station))
+    # Vehicles and charging stations are observed together, once a minute
+    env.process(sim.observe())
 
     """for parking in parkings:
         env.process(sim.obs_PK(parking))"""
 
-    env.process(sim.missed_trip())
+    env.process(sim.learn())
+    env.process(sim.checkpoint(q_table_path))
 
     env.run(until=sim.simulation_time)
+    tracer.close()
+    sim.learner.learn()
 
     '''pd_ve = pd.DataFrame()
     for vehicle in vehicles:
         pd_ve = pd_ve.append(pd.DataFrame(vehicle.count_seconds.values()).transpose())
     pd_ve.to_csv('vehicles.csv')'''
+    # Parquet tables in <results_dir>/<iteration>; pass excel='results.xlsx' to also get the workbook
     sim.save_results(iteration)
+    return sim
+
+
+if __name__ == '__main__':
+    # The Q-table is carried over between iterations and runs
+    q_table_path = 'q_table.npy'
+    q_table = QTable.load(q_table_path, RL_agent.state_shape, mmap_mode='c') if os.path.exists(q_table_path) else None
+
+    for iteration in range(1):
+        print(f'iteration:{iteration}')
+        sim = replication(iteration, q_table=q_table, q_table_path=q_table_path)
+        q_table = sim.learner.q_table
+        q_table.save(q_table_path)
+        print(f'route cache: {route_cache.stats()}')
+
 """
 Extension and debugs:
 . Critical:
@@ -0,0 +1,62 @@
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+# Zones, demand and OD arrays and the travel matrix are loaded here, once, and the road graph in
+# run_replications; forked workers share these pages instead of reading the inputs again
+from main import replication
+from Fleet_sim.Q_learner import RL_agent
+from Fleet_sim.q_table import QTable
+from Fleet_sim.read1 import road_graph, route_cache
+from Fleet_sim.results import merge_results
+
+
+def replication_seeds(n, seed=None):
+    # Independent seeds for n replications, reproducible from one base seed
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(n)]
+
+
+def start_worker():
+    # Every worker opens its own connection to the route cache and commits each new route right away, so
+    # that workers do not hold the database lock for each other
+    route_cache.open()
+    route_cache.commit_every = 1
+
+
+def run_one(iteration, seed, q_table_path, results_dir):
+    # Workers start from the same Q-table, mapped copy-on-write; each saves its own next to its results
+    q_table = None
+    if q_table_path is not None and os.path.exists(q_table_path):
+        q_table = QTable.load(q_table_path, RL_agent.state_shape, mmap_mode='c')
+    directory = os.path.join(results_dir, str(iteration))
+    sim = replication(iteration, seed=seed, q_table=q_table, q_table_path=os.path.join(directory, 'q_table.npy'),
+                      results_dir=results_dir)
+    sim.learner.q_table.save(os.path.join(directory, 'q_table.npy'))
+    return directory
+
+
+def run_replications(n, seeds=None, processes=None, q_table_path='q_table.npy', results_dir='results'):
+    seeds = replication_seeds(n) if seeds is None else list(seeds)
+    # Fork where available, so that the inputs loaded above are inherited rather than re-imported
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    # A stale graph is compiled here rather than by every worker at once, and the workers inherit its
+    # arrays and node index
+    road_graph.load()
+    # The parent's SQLite connection must not be used by the forked workers
+    route_cache.close()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=start_worker) as pool:
+        directories = list(pool.map(run_one, range(n), seeds, [q_table_path] * n, [results_dir] * n))
+    merge_results(directories, os.path.join(results_dir, 'merged'))
+    return directories
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run independent replications in parallel')
+    parser.add_argument('n', type=int, help='number of replications')
+    parser.add_argument('--seed', type=int, default=None, help='base seed of the replication seeds')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--results', default='results', help='results directory')
+    args = parser.parse_args()
+    run_replications(args.n, replication_seeds(args.n, args.seed), args.processes, results_dir=args.results)
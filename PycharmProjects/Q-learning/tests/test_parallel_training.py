@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from Fleet_sim.parallel_training import create_shared_table, merge, write_back
+from Fleet_sim.q_table import QTable
+
+SHAPE = (3, 4)
+
+
+def updates():
+    # (entries, counts, values) of two workers; entry = state * 2 + action
+    first = (np.array([0, 5]), np.array([1.0, 3.0]), np.array([1.0, 2.0], dtype=np.float32))
+    second = (np.array([5, 7]), np.array([1.0, 2.0]), np.array([6.0, 4.0], dtype=np.float32))
+    return [first, second]
+
+
+def test_merge_weights_by_visits(tmp_path):
+    shared = create_shared_table(str(tmp_path / 'shared.npy'), SHAPE, rng=np.random.default_rng(0))
+    before = shared.values.reshape(-1).copy()
+    entries = merge(shared, updates())
+    after = shared.values.reshape(-1)
+    assert entries.tolist() == [0, 5, 7]
+    assert after[0] == 1.0
+    assert after[5] == pytest.approx((3 * 2.0 + 1 * 6.0) / 4)
+    assert after[7] == 4.0
+    untouched = np.setdiff1d(np.arange(len(after)), entries)
+    assert np.array_equal(after[untouched], before[untouched])
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_starting_table_keeps_unvisited_states(tmp_path, lazy):
+    np.random.seed(0)
+    start = QTable(SHAPE, lazy=lazy)
+    learned = [(0, 0), (1, 1), (2, 3)]
+    for state in learned:
+        start[state] = [-0.5, -0.25]
+    known = {state: start[state].copy() for state in (learned if lazy else np.ndindex(*SHAPE))}
+    shared = create_shared_table(str(tmp_path / 'shared.npy'), SHAPE, initial=start, rng=np.random.default_rng(0))
+    states = np.unique(merge(shared, updates()) // 2)
+    result = write_back(shared, states, start)
+    assert result is start
+    for state, q in known.items():
+        if start.index(state) in states:
+            assert np.array_equal(result[state], shared.values[start.index(state)])
+        else:
+            assert np.array_equal(result[state], q)
+    # Entry 5 is state 2, action 1: the count-weighted mean of both workers
+    assert result[np.unravel_index(2, SHAPE)][1] == pytest.approx(3.0)
+
+
+def test_write_back_without_starting_table(tmp_path):
+    shared = create_shared_table(str(tmp_path / 'shared.npy'), SHAPE, rng=np.random.default_rng(0))
+    states = np.unique(merge(shared, updates()) // 2)
+    result = write_back(shared, states)
+    assert result.lazy and len(result) == len(states)
+    for state in states.tolist():
+        assert np.array_equal(result[np.unravel_index(state, SHAPE)], shared.values[state])
@@ -0,0 +1,36 @@
+import os
+import numpy as np
+from Fleet_sim.q_table import QTable
+
+
+def test_add_to_loaded_empty_table(tmp_path):
+    path = str(tmp_path / 'q_table.npy')
+    QTable((10, 24)).save(path)
+    table = QTable.load(path, (10, 24), mmap_mode=None)
+    assert len(table) == 0
+    table[(3, 5)] = [1.0, 2.0]
+    assert len(table) == 1
+    assert np.array_equal(table[(3, 5)], [1.0, 2.0])
+
+
+def test_updates_reach_the_file_only_on_save(tmp_path):
+    path = str(tmp_path / 'q_table.npy')
+    table = QTable((10, 24))
+    table[(3, 5)] = [0.0, 0.0]
+    table.save(path)
+    table = QTable.load(path, (10, 24))
+    idx = table.index_many(np.array([[3, 5]]))
+    table.update(idx, np.array([0]), np.array([5.0]), idx, alpha=0.1, gamma=0.0)
+    assert np.array_equal(QTable.load(path, (10, 24))[(3, 5)], [0.0, 0.0])
+    table.save(path)
+    assert np.array_equal(QTable.load(path, (10, 24))[(3, 5)], [0.5, 0.0])
+
+
+def test_save_dense_table_onto_its_own_file(tmp_path):
+    path = str(tmp_path / 'q_table.npy')
+    QTable((10, 24), lazy=False).save(path)
+    table = QTable.load(path, (10, 24), mmap_mode='r+')
+    table[(3, 5)] = [1.0, 2.0]
+    table.save(path)
+    assert not os.path.exists(path + '.tmp')
+    assert np.array_equal(QTable.load(path, (10, 24))[(3, 5)], [1.0, 2.0])
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import simpy
+from Fleet_sim.fleet_state import FleetState, MODES, MODE_CODES
+from Fleet_sim.location import Location
+from Fleet_sim.model import available_vehicle
+from Fleet_sim.vehicle import Vehicle
+from Fleet_sim.vehicle_index import VehicleIndex
+
+
+def random_fleet(rng, n=200):
+    env = simpy.Environment()
+    fleet = FleetState(n)
+    vehicles = [Vehicle(i, env, Location(rng.uniform(52.35, 52.65), rng.uniform(13.1, 13.7)), 50,
+                        rng.uniform(10, 100), str(rng.choice(MODES)), fleet=fleet) for i in range(n)]
+    return fleet, vehicles
+
+
+def random_trip(rng):
+    return SimpleNamespace(origin=Location(rng.uniform(52.35, 52.65), rng.uniform(13.1, 13.7)),
+                           distance=rng.uniform(1, 20))
+
+
+def assert_same(vehicles, index, rng):
+    for _ in range(50):
+        trip = random_trip(rng)
+        assert available_vehicle(vehicles, trip, index=index) == available_vehicle(vehicles, trip)
+
+
+def test_index_matches_scan():
+    rng = np.random.default_rng(0)
+    fleet, vehicles = random_fleet(rng)
+    index = VehicleIndex(fleet, ('idle', 'parking', 'circling'))
+    assert_same(vehicles, index, rng)
+    # Mode and location changes reach the index through the fleet store
+    for _ in range(3):
+        for row in rng.choice(len(fleet), 80, replace=False).tolist():
+            fleet.set('mode', row, MODE_CODES[str(rng.choice(MODES))])
+            fleet.set('lat', row, rng.uniform(52.35, 52.65))
+            fleet.set('long', row, rng.uniform(13.1, 13.7))
+        assert_same(vehicles, index, rng)
+
+
+def test_index_over_other_fleet():
+    rng = np.random.default_rng(1)
+    _, vehicles = random_fleet(rng, 20)
+    other, _ = random_fleet(rng, 20)
+    with pytest.raises(ValueError):
+        available_vehicle(vehicles, random_trip(rng), index=VehicleIndex(other))